@@ -0,0 +1,216 @@
+"""
+This script benchmarks the preprocessing steps on synthetic data (see synthetic_data.py) and tracks the results
+across commits.
+
+For every scale (number of raw trials) it times remove_z_outliers, filter_data/remove_columns
+(load_data.clean_datasets), the DatasetHandler split, empsim_compiler and combine_dat_files, keeping the best of
+--repeat runs. The default scales (1e3 to 1e5) keep a run short. The generator and the file-based steps stream,
+but remove_z_outliers and the split hold the whole dataset in memory, so about 1e7 rows (several GB) is the
+practical limit; 1e8 rows does not fit in the memory of a typical workstation. Results are appended to a JSON
+file keyed by the current git commit, and the run fails (exit code 1) when a step is more than --tolerance
+slower than in the last recorded run of another commit.
+
+It also measures the startup of the preprocessing modules: a fresh interpreter importing them must finish
+within --startup-budget seconds (default 0.75; importing pandas alone takes most of that) and must not pull in
+the plotting/GUI packages (matplotlib, seaborn, tkinter), which the modules only import where they draw.
+--startup-only runs just this check, in a few seconds.
+
+    python benchmark.py --scales 1e3 1e4 1e5
+    python benchmark.py --startup-only
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import synthetic_data
+
+n_sessions = 2
+n_trials = 100
+
+# Modules a quick command (QC, the split, the pipeline) imports, and the packages they must not load on import
+startup_modules = ['functions', 'load_data', 'datahandler_GSCsplit', 'instrumentation', 'trial_store', 'pipeline']
+heavy_modules = ['matplotlib', 'seaborn', 'tkinter', 'hddm']
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def best_time(func, repeat, setup=None):
+    """Best wall time of repeat calls of func; with setup, each call is func(setup()) and setup is not timed."""
+    times = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def startup_time(modules=startup_modules, repeat=3):
+    """Best wall time of a fresh interpreter importing modules, and the heavy_modules that got imported with them."""
+    code = (f"import sys; import {', '.join(modules)}; "
+            f"print(','.join(m for m in {heavy_modules!r} if m in sys.modules))")
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        times.append(time.perf_counter() - start)
+    loaded = [name for name in result.stdout.strip().split(',') if name]
+    return min(times), loaded
+
+
+def prepare(work_dir, n_rows):
+    """Write the synthetic raw export and simulation outputs for a scale; returns the raw file and simulated folder."""
+    n_participants = synthetic_data.participants_for_rows(n_rows, n_sessions, n_trials)
+    raw_file = os.path.join(work_dir, 'Raw.csv')
+    synthetic_data.write_raw_export(raw_file, n_participants, n_sessions, n_trials)
+    simulated_dir = os.path.join(work_dir, 'simulated')
+    synthetic_data.write_fastdm_outputs(simulated_dir, n_participants, n_sessions, n_trials)
+    return raw_file, simulated_dir
+
+
+def run_benchmarks(n_rows, repeat=3, work_dir=None):
+    """Time every step at a scale of about n_rows raw trials; returns step name -> seconds."""
+    import combinesimulateddata
+    import empsim_compiler
+    import functions as fn
+    import load_data as load
+    from datahandler_GSCsplit import DatasetHandler
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp_dir:
+        simulated_dir = prepare(tmp_dir, n_rows)[1]
+        config = {'directory': tmp_dir}
+        raw = load.load_datasets(tmp_dir, load.data_files, config)
+        datasets = load.clean_datasets({key: df.copy() for key, df in raw.items()}, config)
+
+        # The split reads the corrected data, as main.py writes it
+        corrected_file = os.path.join(tmp_dir, 'raw_corrected.csv')
+        fn.remove_z_outliers(datasets)['Raw Data Set'].to_csv(corrected_file)
+        split_dir = os.path.join(tmp_dir, 'datasets')
+
+        def split():
+            handler = DatasetHandler(corrected_file, ['subj_idx', 'SESSION', 'CONDITION', 'GROUP', 'CLUSTERS',
+                                                      'RISK', 'HEV', 'RESPONSE', 'TIME'])
+            handler.load_csv_dataset()
+            handler.filter_columns()
+            handler.replace_spaces_in_clusters()
+            handler.split_by_group_session_condition_and_save('subj_idx', 'GROUP', 'SESSION', 'CONDITION', split_dir)
+
+        def compile_data():
+            folders = [root for root, dirs, files in os.walk(split_dir) if not dirs]
+            empirical_data = empsim_compiler.process_empirical_data(folders)
+            empsim_compiler.process_simulated_data(simulated_dir, sample_size=len(empirical_data))
+
+        steps = {
+            'remove_z_outliers': lambda: fn.remove_z_outliers(datasets),
+            # clean_datasets works in place, so it gets a fresh copy of the raw data (copied outside the timing)
+            'clean_datasets': (lambda copies: load.clean_datasets(copies, config),
+                               lambda: {key: df.copy() for key, df in raw.items()}),
+            'split': split,
+            'empsim_compiler': compile_data,
+            'combine_dat_files': lambda: combinesimulateddata.combine_dat_files(
+                [simulated_dir], os.path.join(tmp_dir, 'combined.out')),
+        }
+
+        # Steps print progress; keep the benchmark output readable
+        results = {}
+        stdout = sys.stdout
+        for name, step in steps.items():
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                func, setup = step if isinstance(step, tuple) else (step, None)
+                results[name] = best_time(func, repeat, setup)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+    return results
+
+
+def load_results(results_path):
+    if os.path.exists(results_path):
+        with open(results_path) as f:
+            return json.load(f)
+    return []
+
+
+def find_regressions(run, previous_runs, tolerance=0.25, min_seconds=0.01):
+    """Steps of run that are more than tolerance slower than in the last run of another commit.
+
+    Steps faster than min_seconds in both runs are too noisy to compare and are ignored.
+    """
+    baseline = next((previous for previous in reversed(previous_runs) if previous['commit'] != run['commit']), None)
+    if baseline is None:
+        return []
+
+    regressions = []
+    for scale, steps in run['results'].items():
+        for name, seconds in steps.items():
+            old = baseline['results'].get(scale, {}).get(name)
+            if old is not None and max(old, seconds) >= min_seconds and seconds > old * (1 + tolerance):
+                regressions.append((scale, name, old, seconds))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--scales', nargs='+', type=float, default=[1e3, 1e4, 1e5],
+                        help='numbers of raw trials to benchmark at (about 1e7 at most: the split holds all rows in memory)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--results', default='benchmark_results.json', help='JSON file of results per commit')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before failing (0.25 = 25%%)')
+    parser.add_argument('--work-dir', default=None, help='folder for the temporary data (default: system temp)')
+    parser.add_argument('--startup-budget', type=float, default=0.75,
+                        help='seconds allowed for importing the preprocessing modules in a fresh interpreter')
+    parser.add_argument('--startup-only', action='store_true',
+                        help='only check the startup budget; no step timings, nothing written to --results')
+    args = parser.parse_args(argv)
+
+    run = {
+        'commit': current_commit(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': {},
+    }
+    startup_s, loaded = startup_time(repeat=args.repeat)
+    run['startup_s'] = startup_s
+    print(f"Startup: {startup_s:.3f} s to import {', '.join(startup_modules)}")
+    startup_failed = startup_s > args.startup_budget or bool(loaded)
+    if startup_s > args.startup_budget:
+        print(f"Startup over budget: {startup_s:.3f} s > {args.startup_budget:.3f} s")
+    if loaded:
+        print(f"Startup imports {', '.join(loaded)}; import them inside the functions that use them")
+    if args.startup_only:
+        return 1 if startup_failed else 0
+
+    for scale in args.scales:
+        n_rows = int(scale)
+        print(f"Benchmarking {n_rows} rows...")
+        run['results'][str(n_rows)] = run_benchmarks(n_rows, args.repeat, args.work_dir)
+        for name, seconds in run['results'][str(n_rows)].items():
+            print(f"  {name}: {seconds:.4f} s")
+
+    previous_runs = load_results(args.results)
+    regressions = find_regressions(run, previous_runs, args.tolerance)
+    with open(args.results, 'w') as f:
+        json.dump(previous_runs + [run], f, indent=1)
+
+    for scale, name, old, seconds in regressions:
+        print(f"Regression at {scale} rows: {name} took {seconds:.4f} s, was {old:.4f} s")
+    return 1 if regressions or startup_failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
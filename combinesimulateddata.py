@@ -1,13 +1,24 @@
 """
 This script is for combining multiple .dat files (simulation outputs) from selected folders into a single file for easier management and analysis.
+
+combine_dat_files_indexed additionally writes a sidecar index (output file + '.index.json') recording where every
+source file's block starts, so consumers can seek straight to one subject's rows, and re-running it on a growing
+folder only appends the files that have not been merged yet.
 """
 
 
+import hashlib
+import json
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import shutil
-import tkinter as tk
-from tkinter import filedialog
+
+copy_buffer_size = 1 << 20
+
+# e.g. probiotic_s1_sham_pt_15_sim.dat, as written by simulate_mvrnorm.R
+dat_filename_pattern = re.compile(r'^(?P<group>[^_]+)_(?P<session>[^_]+)_(?P<condition>[^_]+)_(?P<subject>.+?)(?:_sim)?$')
 
 def combine_dat_files(folders, output_file_path):
     with open(output_file_path, 'wb') as outfile:  # Open the output file once
@@ -16,13 +27,144 @@ def combine_dat_files(folders, output_file_path):
                 with open(dat_file, 'rb') as infile:  # Open each input file
                     shutil.copyfileobj(infile, outfile)  # Efficiently copy the contents
 
-# Set up the root tkinter window
-root = tk.Tk()
-root.attributes('-topmost', True)
-root.withdraw()
+def parse_dat_metadata(dat_file):
+    """Group, session, condition and subject from a simulation output file name (empty if it does not match)."""
+    match = dat_filename_pattern.match(Path(dat_file).stem)
+    return match.groupdict() if match else {}
+
+def scan_dat_file(dat_file):
+    """Hash a file and count its rows in one read; returns (sha256, rows, whether it lacks a final newline)."""
+    sha = hashlib.sha256()
+    rows = 0
+    last = b'\n'
+    with open(dat_file, 'rb') as infile:
+        for block in iter(lambda: infile.read(copy_buffer_size), b''):
+            sha.update(block)
+            rows += block.count(b'\n')
+            last = block[-1:]
+    # A last row without a newline still counts, and gets one in the combined file
+    missing_newline = last != b'\n'
+    return sha.hexdigest(), rows + missing_newline, missing_newline
+
+def load_index(index_path):
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            return json.load(f)
+    return {'files': []}
+
+def copy_block(source, out_fd, offset, length):
+    # Positional writes, so several blocks can be copied into the output at once
+    with open(source, 'rb') as infile:
+        position = offset
+        for block in iter(lambda: infile.read(copy_buffer_size), b''):
+            os.pwrite(out_fd, block, position)
+            position += len(block)
+    if position < offset + length:
+        os.pwrite(out_fd, b'\n', position)
+
+def combine_dat_files_indexed(folders, output_file_path, index_path=None, max_workers=None):
+    """Append the .dat files under folders to output_file_path and record every block in a JSON index.
+
+    Each index entry holds the source path, byte offset and length in the output, row count, the
+    source's size, mtime and sha256, and the group/session/condition/subject parsed from its name.
+    Files whose path, size and mtime match an entry, or whose content hash is already in the index,
+    are skipped; the latter are recorded under 'duplicates' with the source they duplicate and a copy of
+    its block reference (offset, length, rows), so later runs skip them without hashing them again and
+    find_blocks finds them. A file without a final newline gets one in the output. Blocks are copied in parallel with positional writes where the OS supports them.
+
+    Returns the list of entries added by this call.
+    """
+    output_file_path = Path(output_file_path)
+    index_path = Path(index_path) if index_path else Path(str(output_file_path) + '.index.json')
+    index = load_index(index_path) if output_file_path.exists() else {'files': []}
+
+    known = {entry['source']: entry for entry in index['files'] + index.get('duplicates', [])}
+    known_hashes = {entry['sha256']: entry for entry in index['files']}
+
+    candidates = []
+    for folder in folders:
+        for dat_file in Path(folder).rglob('*.dat'):
+            if dat_file.resolve() == output_file_path.resolve():
+                continue
+            stat = dat_file.stat()
+            entry = known.get(dat_file.resolve().as_posix())
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                continue
+            candidates.append((dat_file, stat))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        scans = list(executor.map(scan_dat_file, [dat_file for dat_file, stat in candidates]))
+
+    offset = output_file_path.stat().st_size if output_file_path.exists() else 0
+    new_entries = []
+    duplicates = []
+    for (dat_file, stat), (sha, rows, missing_newline) in zip(candidates, scans):
+        source = dat_file.resolve().as_posix()
+        original = known_hashes.get(sha)
+        if original is not None:
+            if original['source'] == source:
+                # Touched but unchanged: only the stat changes
+                original.update({'size': stat.st_size, 'mtime': stat.st_mtime})
+            else:
+                # The block stays in the output even if the original source is changed and appended again
+                duplicate = {'source': source, 'offset': original['offset'], 'length': original['length'],
+                             'rows': original['rows'], 'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': sha,
+                             'duplicate_of': original['source']}
+                duplicate.update(parse_dat_metadata(dat_file))
+                duplicates.append(duplicate)
+            continue
+        entry = {'source': source, 'offset': offset, 'length': stat.st_size + missing_newline, 'rows': rows,
+                 'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': sha}
+        entry.update(parse_dat_metadata(dat_file))
+        new_entries.append(entry)
+        known_hashes[sha] = entry
+        offset += entry['length']
+
+    if hasattr(os, 'pwrite'):
+        # Not opened in append mode: with O_APPEND, pwrite ignores the offset on Linux
+        out_fd = os.open(output_file_path, os.O_WRONLY | os.O_CREAT)
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(lambda entry: copy_block(entry['source'], out_fd, entry['offset'], entry['length']),
+                                  new_entries))
+        finally:
+            os.close(out_fd)
+    else:
+        with open(output_file_path, 'ab') as outfile:
+            for entry in new_entries:
+                with open(entry['source'], 'rb') as infile:
+                    shutil.copyfileobj(infile, outfile, copy_buffer_size)
+                if entry['length'] > entry['size']:
+                    outfile.write(b'\n')
+
+    # A changed source file is appended again; its old block stays in the output but leaves the index
+    replaced = set(entry['source'] for entry in new_entries + duplicates)
+    index['files'] = [entry for entry in index['files'] if entry['source'] not in replaced] + new_entries
+    index['duplicates'] = [entry for entry in index.get('duplicates', []) if entry['source'] not in replaced] + duplicates
+    with open(index_path, 'w') as f:
+        json.dump(index, f, indent=1)
+    return new_entries
+
+def find_blocks(output_file_path, index_path=None, **metadata):
+    """Index entries of a combined file whose metadata matches, e.g. find_blocks(path, subject='pt_15', session='s1').
+
+    Files skipped as duplicates are included; their entries point at the block with the same content.
+    """
+    index_path = index_path or str(output_file_path) + '.index.json'
+    index = load_index(index_path)
+    return [entry for entry in index['files'] + index.get('duplicates', [])
+            if all(entry.get(key) == value for key, value in metadata.items())]
+
+def read_block(output_file_path, entry):
+    """Read the bytes of one source file back out of a combined file (parse with fastdm_io.parse_fastdm_text)."""
+    with open(output_file_path, 'rb') as infile:
+        infile.seek(entry['offset'])
+        return infile.read(entry['length'])
 
 # Function to select folders repeatedly
 def select_folders():
+    from tkinter import filedialog
+
     folders = []
     while True:
         folder = filedialog.askdirectory(title="Select a folder containing .dat files, Cancel to stop")
@@ -32,16 +174,33 @@ def select_folders():
             break
     return folders
 
-selected_folders = select_folders()
+if __name__ == '__main__':
+    import tkinter as tk
+    from tkinter import filedialog
+
+    # True: keep an index of the blocks and only append files not merged yet (combine_dat_files_indexed);
+    # False: rewrite the output as a plain concatenation
+    indexed = True
 
-if selected_folders:
-    output_file_path = filedialog.asksaveasfilename(defaultextension=".dat", filetypes=[("DAT files", "*.dat")], title="Save combined file as")
-    if output_file_path:
-        combine_dat_files(selected_folders, output_file_path)
-        print(f"All .dat files have been combined into {output_file_path}")
+    # Set up the root tkinter window
+    root = tk.Tk()
+    root.attributes('-topmost', True)
+    root.withdraw()
+
+    selected_folders = select_folders()
+
+    if selected_folders:
+        output_file_path = filedialog.asksaveasfilename(defaultextension=".dat", filetypes=[("DAT files", "*.dat")], title="Save combined file as")
+        if output_file_path:
+            if indexed:
+                added = combine_dat_files_indexed(selected_folders, output_file_path)
+                print(f"Appended {len(added)} new .dat files to {output_file_path} (index: {output_file_path}.index.json)")
+            else:
+                combine_dat_files(selected_folders, output_file_path)
+                print(f"All .dat files have been combined into {output_file_path}")
+        else:
+            print("No output file selected.")
     else:
-        print("No output file selected.")
-else:
-    print("No folders were selected.")
+        print("No folders were selected.")
 
-root.destroy()
+    root.destroy()
@@ -0,0 +1,68 @@
+"""
+Shared CSV reader for the wide raw export and the corrected datasets.
+Columns that are not needed are never parsed (usecols projection), dtypes are applied while parsing,
+and selected numeric columns are downcast to the smallest type that holds their values.
+"""
+
+import pandas as pd
+from pandas.api.types import is_integer_dtype, is_numeric_dtype
+
+
+def projected_columns(header, columns_to_keep=None, columns_to_remove=None):
+    """Return the columns of header that survive the keep/remove lists, in file order."""
+    columns_to_remove = set(columns_to_remove or [])
+    return [col for col in header
+            if (columns_to_keep is None or col in columns_to_keep) and col not in columns_to_remove]
+
+
+def downcast_columns(df, columns):
+    """Downcast numeric columns in place: integral values to the smallest integer type (e.g. int8), others to float32.
+
+    Returns the number of bytes saved.
+    """
+    bytes_before = df.memory_usage(deep=True).sum()
+    for col in columns:
+        if col not in df.columns or not is_numeric_dtype(df[col]):
+            continue
+        as_integer = pd.to_numeric(df[col], downcast='integer')
+        if is_integer_dtype(as_integer):
+            df[col] = as_integer
+        else:
+            df[col] = pd.to_numeric(df[col], downcast='float')
+    return int(bytes_before - df.memory_usage(deep=True).sum())
+
+
+def read_csv_projected(file_path, columns_to_keep=None, columns_to_remove=None, dtype=None, downcast=None,
+                       sample_rows=1000, **read_kwargs):
+    """Read a CSV file, parsing only the columns that survive columns_to_keep/columns_to_remove.
+
+    dtype entries for columns that are not read are ignored, so one dtype mapping can serve every file.
+    Columns listed in downcast are downcast after parsing (see downcast_columns). Extra keyword
+    arguments are passed on to pd.read_csv.
+
+    Returns the dataframe and a report dict with the columns read and skipped, and the bytes saved by
+    skipping columns (estimated from the first sample_rows rows) and by downcasting.
+    """
+    sample = pd.read_csv(file_path, nrows=sample_rows, **read_kwargs)
+    usecols = projected_columns(sample.columns, columns_to_keep, columns_to_remove)
+    skipped = [col for col in sample.columns if col not in usecols]
+    dtype = {col: col_type for col, col_type in (dtype or {}).items() if col in usecols}
+
+    df = pd.read_csv(file_path, usecols=usecols, dtype=dtype, **read_kwargs)
+
+    skipped_bytes = 0
+    if len(sample) and skipped:
+        bytes_per_row = sample[skipped].memory_usage(deep=True, index=False).sum() / len(sample)
+        skipped_bytes = int(bytes_per_row * len(df))
+    downcast_bytes = downcast_columns(df, downcast or [])
+
+    report = {
+        'file_path': str(file_path),
+        'rows': len(df),
+        'columns_read': usecols,
+        'columns_skipped': skipped,
+        'bytes_saved_skipped_columns': skipped_bytes,
+        'bytes_saved_downcast': downcast_bytes,
+        'bytes_saved': skipped_bytes + downcast_bytes,
+    }
+    return df, report
@@ -3,19 +3,42 @@ This script is designed to handle and manipulate datasets, specifically for spli
 """
 
 
-import pandas as pd
+import hashlib
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+
+from csv_reader import read_csv_projected
+from trial_store import is_trial_store, load_trial_store, read_schema
+
 class DatasetHandler:
-    def __init__(self, file_path, columns_to_keep):
+    def __init__(self, file_path, columns_to_keep, data_types=None, downcast_columns=None):
         self.file_path = file_path
         self.columns_to_keep = columns_to_keep
+        self.data_types = data_types
+        self.downcast_columns = downcast_columns
         self.dataset = None
+        self.partition_fingerprints = {}
     
     def load_csv_dataset(self):
         try:
-            self.dataset = pd.read_csv(self.file_path)
+            if is_trial_store(self.file_path):
+                # A trial store folder (see trial_store.py) is memory-mapped instead of parsed; columns it
+                # lacks are left out, as in the CSV path, and reported by filter_columns
+                stored = read_schema(self.file_path)['columns']
+                columns = None if self.columns_to_keep is None else [col for col in self.columns_to_keep if col in stored]
+                self.dataset = load_trial_store(self.file_path, columns=columns)
+                print(f"Dataset loaded successfully from trial store {self.file_path}")
+                return
+            # Only the columns in columns_to_keep are parsed
+            self.dataset, report = read_csv_projected(self.file_path, columns_to_keep=self.columns_to_keep,
+                                                      dtype=self.data_types, downcast=self.downcast_columns)
             print(f"Dataset loaded successfully from {self.file_path}")
+            print(f"Skipped {len(report['columns_skipped'])} columns, saving about {report['bytes_saved']} bytes.")
         except FileNotFoundError:
             print(f"The file {self.file_path} does not exist.")
         except pd.errors.EmptyDataError:
@@ -35,44 +58,149 @@ class DatasetHandler:
 
     def replace_spaces_in_clusters(self):
         if self.dataset is not None:
-            self.dataset['CLUSTERS'] = self.dataset['CLUSTERS'].str.replace(' ', '_', regex=False)
+            clusters = self.dataset['CLUSTERS']
+            if isinstance(clusters.dtype, pd.CategoricalDtype):
+                # Only the categories need rewriting
+                self.dataset['CLUSTERS'] = clusters.cat.rename_categories(lambda cluster: cluster.replace(' ', '_'))
+            else:
+                self.dataset['CLUSTERS'] = clusters.str.replace(' ', '_', regex=False)
             print("Replaced spaces with underscores in 'CLUSTERS' column.")
 
     def save_as_txt(self, dataframe, file_path):
-        with open(file_path, 'w') as f:
+        with open(file_path, 'w', buffering=1 << 16) as f:
             f.write('#' + '\t'.join(dataframe.columns) + '\n')
             dataframe.to_csv(f, sep='\t', index=False, header=False)
 
-    def split_by_group_session_condition_and_save(self, subj_column, group_column, session_column, condition_column, base_output_dir):
-        if self.dataset is not None:
+    def format_as_txt(self, dataframe):
+        return '#' + '\t'.join(dataframe.columns) + '\n' + dataframe.to_csv(sep='\t', index=False, header=False)
+
+    def group_boundaries(self, columns):
+        """Sort the dataset once by columns and find the contiguous row range of every key combination.
+
+        Returns the sorted dataset and a list of (key values, start, stop) tuples. The sort is stable, so
+        rows keep their original order within a group. Rows with a missing key are left out, as in groupby.
+        """
+        codes = []
+        uniques = []
+        for col in columns:
+            col_codes, col_uniques = pd.factorize(self.dataset[col], sort=True)
+            codes.append(col_codes)
+            uniques.append(col_uniques)
+        codes = np.vstack(codes)
+
+        order = np.lexsort(codes[::-1])  # first column is the primary key
+        order = order[(codes[:, order] >= 0).all(axis=0)]
+        if len(order) == 0:
+            return self.dataset.iloc[order], []
+
+        sorted_codes = codes[:, order]
+        changes = np.flatnonzero((sorted_codes[:, 1:] != sorted_codes[:, :-1]).any(axis=0)) + 1
+        starts = np.concatenate([[0], changes])
+        stops = np.concatenate([changes, [len(order)]])
+
+        boundaries = []
+        for start, stop in zip(starts, stops):
+            keys = tuple(uniques[i][sorted_codes[i, start]] for i in range(len(columns)))
+            boundaries.append((keys, int(start), int(stop)))
+        return self.dataset.iloc[order], boundaries
+
+    def split_path(self, group_name, session_name, condition_name, subj_name):
+        subj_number = subj_name.strip('PT')
+        # change suffix (.txt, .csv, .dat) to save different file type
+        return Path(group_name.lower()) / f'session {session_name}' / condition_name.lower() / f'pt_{subj_number}.txt'
+
+    def partition_fingerprint(self, dataframe):
+        """Content hash of one participant file's rows (column names included, index ignored)."""
+        sha = hashlib.sha256('\t'.join(dataframe.columns).encode())
+        sha.update(pd.util.hash_pandas_object(dataframe, index=False).to_numpy().tobytes())
+        return sha.hexdigest()
+
+    def split_by_group_session_condition_and_save(self, subj_column, group_column, session_column, condition_column, base_output_dir,
+                                                   max_workers=None, archive_path=None, previous_fingerprints=None,
+                                                   fingerprints=False):
+        """Save one tab-separated file per group > session > condition > participant under base_output_dir.
+
+        The dataset is sorted once and every file is a contiguous slice of the sorted rows. Directories are
+        created up front and the files are written on a thread pool. With archive_path set, all files are
+        instead written into that single file, with a JSON index (archive_path + '.index.json') giving the
+        byte offset, length and row count of every file; see read_archive_block.
+
+        previous_fingerprints (file path -> fingerprint, from an earlier run's partition_fingerprints)
+        makes the split incremental: files whose rows are unchanged are not rewritten, and files of
+        participants that no longer appear are deleted. The fingerprints of this run are stored in
+        self.partition_fingerprints; they are only computed in incremental mode or with fingerprints=True
+        (e.g. for the first run of an incremental split).
+
+        Returns a dict of file path (relative to base_output_dir) -> number of rows, for the files written.
+        """
+        if self.dataset is None:
+            print("No dataset to split. Please ensure the dataset is loaded and filtered correctly.")
+            return {}
+
+        sorted_dataset, boundaries = self.group_boundaries([group_column, session_column, condition_column, subj_column])
+        paths = [self.split_path(*keys) for keys, start, stop in boundaries]
+        slices = [sorted_dataset.iloc[start:stop] for keys, start, stop in boundaries]
+        self.partition_fingerprints = {}
+        if fingerprints or previous_fingerprints is not None:
+            self.partition_fingerprints = {str(path): self.partition_fingerprint(subj_df)
+                                           for path, subj_df in zip(paths, slices)}
+
+        if previous_fingerprints is not None and archive_path is None:
             base_output_path = Path(base_output_dir)
-            base_output_path.mkdir(exist_ok=True)
-            for group_name, group_df in self.dataset.groupby(group_column):
-                group_path = base_output_path / group_name.lower()
-                group_path.mkdir(exist_ok=True)
-                
-                for session_name, session_df in group_df.groupby(session_column):
-                    session_path = group_path / f'session {session_name}'
-                    session_path.mkdir(exist_ok=True)
-
-                    for condition_name, condition_df in session_df.groupby(condition_column):
-                        condition_path = session_path / condition_name.lower()
-                        condition_path.mkdir(exist_ok=True)
-                    
-                        for subj_name, subj_df in condition_df.groupby(subj_column):
-                            subj_number = subj_name.strip('PT')
-                            filename = condition_path / f'pt_{subj_number}.txt' # change suffic (.txt, .csv, .dat) to save different file type
-                            self.save_as_txt(subj_df, filename)
-                            print(f"Saved {subj_column} {subj_name} dataset to {filename}")
+            for stale_path in set(previous_fingerprints) - set(self.partition_fingerprints):
+                if (base_output_path / stale_path).exists():
+                    (base_output_path / stale_path).unlink()
+            changed = [i for i, path in enumerate(paths)
+                       if previous_fingerprints.get(str(path)) != self.partition_fingerprints[str(path)]
+                       or not (base_output_path / path).exists()]
+            print(f"{len(paths) - len(changed)} {subj_column} datasets unchanged.")
+            paths = [paths[i] for i in changed]
+            slices = [slices[i] for i in changed]
+
+        if archive_path is not None:
+            self.save_archive(paths, slices, archive_path, max_workers)
+            print(f"Saved {len(paths)} {subj_column} datasets to {archive_path}")
         else:
-            print("No dataset to split. Please ensure the dataset is loaded and filtered correctly.")
+            base_output_path = Path(base_output_dir)
+            for directory in sorted(set(path.parent for path in paths)):
+                (base_output_path / directory).mkdir(parents=True, exist_ok=True)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(self.save_as_txt, slices, [base_output_path / path for path in paths]))
+            print(f"Saved {len(paths)} {subj_column} datasets to {base_output_path}")
+
+        return {str(path): len(subj_df) for path, subj_df in zip(paths, slices)}
+
+    def save_archive(self, paths, dataframes, archive_path, max_workers=None):
+        index = {}
+        offset = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, open(archive_path, 'wb') as archive:
+            for path, subj_df, block in zip(paths, dataframes, executor.map(self.format_as_txt, dataframes)):
+                data = block.encode()
+                archive.write(data)
+                index[path.as_posix()] = {'offset': offset, 'length': len(data), 'rows': len(subj_df)}
+                offset += len(data)
+        with open(str(archive_path) + '.index.json', 'w') as f:
+            json.dump(index, f, indent=1)
+
+
+def read_archive_block(archive_path, relative_path):
+    """Read one participant file (e.g. 'placebo/session 1/sham/pt_01.txt') from a split archive as a dataframe."""
+    with open(str(archive_path) + '.index.json') as f:
+        entry = json.load(f)[Path(relative_path).as_posix()]
+    with open(archive_path, 'rb') as archive:
+        archive.seek(entry['offset'])
+        block = archive.read(entry['length'])
+    return pd.read_csv(io.BytesIO(block), sep='\t').rename(columns=lambda col: col.lstrip('#'))
+
 
-# Usage
-file_path = r"C:\Users\Darren\Desktop\CODE\FASTDM\raw_corrected.csv"  # Replace with your CSV file path
-columns_to_keep = ['subj_idx', 'SESSION', 'CONDITION', 'GROUP', 'CLUSTERS', 'RISK', 'HEV', 'RESPONSE', 'TIME']
+if __name__ == '__main__':
+    # Usage
+    file_path = r"C:\Users\Darren\Desktop\CODE\FASTDM\raw_corrected.csv"  # Replace with your CSV file path
+    columns_to_keep = ['subj_idx', 'SESSION', 'CONDITION', 'GROUP', 'CLUSTERS', 'RISK', 'HEV', 'RESPONSE', 'TIME']
+    data_types = {'subj_idx': 'str', 'GROUP': 'str', 'CONDITION': 'str', 'CLUSTERS': 'str'}
 
-handler = DatasetHandler(file_path, columns_to_keep)
-handler.load_csv_dataset()
-handler.filter_columns()
-handler.replace_spaces_in_clusters()
-handler.split_by_group_session_condition_and_save('subj_idx', 'GROUP', 'SESSION', 'CONDITION', 'datasets') #first 4 are column handles, last is name of parent folder
+    handler = DatasetHandler(file_path, columns_to_keep, data_types, downcast_columns=['RESPONSE'])
+    handler.load_csv_dataset()
+    handler.filter_columns()
+    handler.replace_spaces_in_clusters()
+    handler.split_by_group_session_condition_and_save('subj_idx', 'GROUP', 'SESSION', 'CONDITION', 'datasets') #first 4 are column handles, last is name of parent folder
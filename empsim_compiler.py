@@ -4,10 +4,19 @@ specifically for use with an empsim_scatterplotter module to create model recove
 """
 
 
+import numpy as np
 import pandas as pd
 import os
 import re
 
+from fastdm_io import read_fastdm_output
+from trial_store import load_trial_store
+
+def normalize_group(group):
+    # Group names as used in the compiled data: lower case, 'probiotics' as 'probiotic'
+    group = str(group).lower()
+    return {'probiotics': 'probiotic'}.get(group, group)
+
 def process_empirical_file(file_path):
     # Read and keep specific columns
     df = pd.read_csv(file_path, delimiter='\s+',
@@ -19,22 +28,48 @@ def process_empirical_file(file_path):
 
     # Transform subject and group values
     df['subject'] = df['subject'].apply(lambda x: x.lstrip('PT00').zfill(2))
-    df['group'] = df['group'].str.lower()
-    df['group'] = df['group'].replace({'probiotics': 'probiotic'})
+    df['group'] = df['group'].map(normalize_group)
     # Add type column
     df['type'] = 'E'
 
     return df
 
-def process_simulated_file(file_path):
+def rename_categories(column, rename):
+    """Apply rename to the categories of a categorical column only; categories that become equal are merged."""
+    renamed = column.cat.categories.map(rename)
+    categories = pd.Index(renamed).unique()
+    codes = column.cat.codes.to_numpy()
+    new_codes = np.where(codes >= 0, categories.get_indexer(renamed)[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(new_codes, categories), index=column.index)
+
+def process_empirical_store(store_dir):
+    """The empirical data of process_empirical_data, read from a trial store of the corrected data (see
+    trial_store.py) instead of the per-participant files."""
+    df = load_trial_store(store_dir, columns=['subj_idx', 'SESSION', 'GROUP', 'RESPONSE', 'TIME'])
+    df.rename(columns={'subj_idx': 'subject', 'SESSION': 'session',
+                       'GROUP': 'group', 'RESPONSE': 'response', 'TIME': 'RT'}, inplace=True)
+
+    # Transform subject and group values (on the categories, not on every row)
+    df['subject'] = rename_categories(df['subject'], lambda x: x.lstrip('PT00').zfill(2))
+    df['group'] = rename_categories(df['group'], normalize_group)
+    df['type'] = 'E'
+
+    return df.reset_index(drop=True)
+
+def parse_simulated_filename(file_path):
     # Extract subject, session, and group from filename
     filename = os.path.basename(file_path)
     subject = re.search('pt_(\d+)', filename).group(1)[-2:]
     session = re.search('s(\d)', filename).group(1)
-    group = filename.split('_')[0].lower()
+    group = normalize_group(filename.split('_')[0])
+    return subject, session, group
+
+def process_simulated_file(file_path):
+    subject, session, group = parse_simulated_filename(file_path)
 
-    # Read file with no headers
-    df = pd.read_csv(file_path, header=None, names=['response', 'RT'], delimiter='\s+')
+    # Read file with no headers (bulk numeric conversion, int8 response and float32 RT)
+    response, rt = read_fastdm_output(file_path)
+    df = pd.DataFrame({'response': response, 'RT': rt})
 
     # Add extracted information
     df['subject'] = subject
@@ -54,21 +89,72 @@ def process_empirical_data(empirical_folders):
                 empirical_data.append(df)
     return pd.concat(empirical_data, ignore_index=True)
 
-def process_simulated_data(simulated_folder):
-    simulated_data = []
-    for file in os.listdir(simulated_folder):
-        if file.endswith('_sim.dat'):
-            file_path = os.path.join(simulated_folder, file)
-            df = process_simulated_file(file_path)
-            simulated_data.append(df)
-    simulated_df = pd.concat(simulated_data, ignore_index=True)
-
-    # Downsample the simulated dataframe
-    empirical_count = len(empirical_data)
-    downsampled_simulated = simulated_df.iloc[::(len(simulated_df) // empirical_count), :].copy()
-    downsampled_simulated = downsampled_simulated.iloc[:empirical_count, :]
-
-    return downsampled_simulated
+def simulated_files(simulated_folder):
+    return [os.path.join(simulated_folder, file) for file in sorted(os.listdir(simulated_folder))
+            if file.endswith('_sim.dat')]
+
+def stratum_key(subject, session, group):
+    return (str(subject), str(session), str(group))
+
+def empirical_sample_sizes(empirical_data):
+    """Number of empirical trials per (subject, session, group), for use as process_simulated_data's sample_size."""
+    sizes = empirical_data.groupby(['subject', 'session', 'group']).size()
+    return {stratum_key(*key): int(n) for key, n in sizes.items()}
+
+def file_quotas(files, sample_size):
+    """Split sample_size over the simulated files.
+
+    An int is the total number of rows, spread evenly over all files. A dict maps
+    (subject, session, group) to the number of rows for that stratum, spread evenly over its files;
+    simulated strata missing from it get no rows and are reported.
+    """
+    if isinstance(sample_size, dict):
+        strata = {}
+        for file_path in files:
+            key = stratum_key(*parse_simulated_filename(file_path))
+            strata.setdefault(key, []).append(file_path)
+        groups = [(stratum_files, sample_size.get(key, 0)) for key, stratum_files in strata.items()]
+        unmatched = sorted(key for key in strata if key not in sample_size)
+        if unmatched:
+            print(f"No empirical trials for {len(unmatched)} simulated (subject, session, group) strata, "
+                  f"which are left out: {unmatched}")
+    else:
+        groups = [(files, sample_size)]
+
+    quotas = {}
+    for group_files, total in groups:
+        per_file, remainder = divmod(total, len(group_files))
+        for i, file_path in enumerate(group_files):
+            quotas[file_path] = per_file + (1 if i < remainder else 0)
+    return quotas
+
+def sample_simulated_file(file_path, n):
+    """Parse one simulated file and keep n rows spread evenly over it (the same stride downsampling as before)."""
+    df = process_simulated_file(file_path)
+    if n <= 0:
+        return df.iloc[:0]
+    return df.iloc[::max(len(df) // n, 1), :].iloc[:n].copy()
+
+def process_simulated_data(simulated_folder, sample_size, workers=None):
+    """Compile a downsampled simulated dataset, parsing one file at a time.
+
+    sample_size is the number of rows to keep: an int total (e.g. len(empirical_data)) or a dict of
+    rows per (subject, session, group) such as empirical_sample_sizes(empirical_data). Each file is
+    downsampled right after it is parsed, so only the kept rows are held in memory. With workers set,
+    files are parsed on a process pool of that size.
+    """
+    files = simulated_files(simulated_folder)
+    quotas = file_quotas(files, sample_size)
+    counts = [quotas[file_path] for file_path in files]
+
+    if workers:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            samples = list(executor.map(sample_simulated_file, files, counts))
+    else:
+        samples = [sample_simulated_file(file_path, n) for file_path, n in zip(files, counts)]
+
+    return pd.concat(samples, ignore_index=True)
 
 def reorder_columns(df):
     desired_order = ['subject', 'session', 'group', 'type', 'response', 'RT']
@@ -77,32 +163,36 @@ def reorder_columns(df):
 def save_data_to_csv(data, output_path):
     data.to_csv(output_path, index=False)
 
-# Define paths to the data
-simulated_folder = r'C:\Users\Darren\Desktop\CODE\FASTDM\models\for compiler code\sim_b0'
-empirical_folders = [
-    r'C:\Users\Darren\Desktop\CODE\FASTDM\models\for compiler code\emp_b0\placebo_s1',
-    r'C:\Users\Darren\Desktop\CODE\FASTDM\models\for compiler code\emp_b0\placebo_s2',
-    r'C:\Users\Darren\Desktop\CODE\FASTDM\models\for compiler code\emp_b0\probiotic_s1',
-    r'C:\Users\Darren\Desktop\CODE\FASTDM\models\for compiler code\emp_b0\probiotic_s2'
-]
-
-# Process empirical and simulated data
-empirical_data = process_empirical_data(empirical_folders)
-simulated_data = process_simulated_data(simulated_folder)
-
-# Ensure column order matches
-empirical_data = reorder_columns(empirical_data)
-simulated_data = reorder_columns(simulated_data)
-
-# Save the data to CSV files
-empirical_output_path = r'C:\Users\Darren\Desktop\CODE\FASTDM\empirical_data.csv'
-simulated_output_path = r'C:\Users\Darren\Desktop\CODE\FASTDM\simulated_data.csv'
-
-save_data_to_csv(empirical_data, empirical_output_path)
-save_data_to_csv(simulated_data, simulated_output_path)
-
-# Print out the shapes of the data
-print(f"The shape of the empirical data is: {empirical_data.shape}")
-print(f"The empirical data is saved to: {empirical_output_path}")
-print(f"The shape of the simulated data is: {simulated_data.shape}")
-print(f"The simulated data is saved to: {simulated_output_path}")
+if __name__ == '__main__':
+    # Define paths to the data
+    simulated_folder = r'C:\Users\Darren\Desktop\CODE\FASTDM\models\for compiler code\sim_b0'
+    empirical_folders = [
+        r'C:\Users\Darren\Desktop\CODE\FASTDM\models\for compiler code\emp_b0\placebo_s1',
+        r'C:\Users\Darren\Desktop\CODE\FASTDM\models\for compiler code\emp_b0\placebo_s2',
+        r'C:\Users\Darren\Desktop\CODE\FASTDM\models\for compiler code\emp_b0\probiotic_s1',
+        r'C:\Users\Darren\Desktop\CODE\FASTDM\models\for compiler code\emp_b0\probiotic_s2'
+    ]
+
+    # Process empirical and simulated data
+    empirical_data = process_empirical_data(empirical_folders)
+    # or read the corrected data from the trial store main.py writes:
+    # empirical_data = process_empirical_store(r'C:\Users\Darren\Desktop\CODE\FASTDM\raw_corrected_store')
+    # Keep as many simulated trials per subject, session and group as there are empirical ones
+    simulated_data = process_simulated_data(simulated_folder, sample_size=empirical_sample_sizes(empirical_data))
+
+    # Ensure column order matches
+    empirical_data = reorder_columns(empirical_data)
+    simulated_data = reorder_columns(simulated_data)
+
+    # Save the data to CSV files
+    empirical_output_path = r'C:\Users\Darren\Desktop\CODE\FASTDM\empirical_data.csv'
+    simulated_output_path = r'C:\Users\Darren\Desktop\CODE\FASTDM\simulated_data.csv'
+
+    save_data_to_csv(empirical_data, empirical_output_path)
+    save_data_to_csv(simulated_data, simulated_output_path)
+
+    # Print out the shapes of the data
+    print(f"The shape of the empirical data is: {empirical_data.shape}")
+    print(f"The empirical data is saved to: {empirical_output_path}")
+    print(f"The shape of the simulated data is: {simulated_data.shape}")
+    print(f"The simulated data is saved to: {simulated_output_path}")
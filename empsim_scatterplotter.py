@@ -1,69 +1,104 @@
 """
-The purpose of this script is to compare empirical and simulated data. 
+The purpose of this script is to compare empirical and simulated data.
 It plots scatterplots to visualize the correspondence between these two datasets.
 It's important to note that the simulated data must be downsampled to match the empirical data's size.
 """
 
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-# Read the data files
-empirical_data_path = r'C:\Users\Darren\Desktop\CODE\FASTDM\empirical_data.csv'
-simulated_data_path = r'C:\Users\Darren\Desktop\CODE\FASTDM\simulated_data.csv'
-
-empirical_data = pd.read_csv(empirical_data_path)
-simulated_data = pd.read_csv(simulated_data_path)
-
-# Rename 'Session' and 'Group' columns
-empirical_data.rename(columns={'session': 'Session', 'group': 'Group'}, inplace=True)
-simulated_data.rename(columns={'session': 'Session', 'group': 'Group'}, inplace=True)
+group_columns = ['subject', 'Group', 'Session']
 
 # Function to calculate the percentage of correct responses
 def calculate_percent_correct(data):
-    percent_correct = data.groupby(['subject', 'Group', 'Session'])['response'].apply(lambda x: (x.sum() / len(x)) * 100)
+    percent_correct = data.groupby(group_columns)['response'].mean() * 100
     return percent_correct.reset_index()
 
+def assign_quantile_bins(data, quantiles, by='type'):
+    """Assign every trial to its RT quantile bin in one searchsorted pass per dataset.
+
+    The quantile edges are computed separately for each value of the by column (empirical 'E' and
+    simulated 'S'). Bin i holds the trials with RT up to the i-th quantile and above the previous one;
+    bin len(quantiles) holds the trials above the last quantile.
+    """
+    rt = data['RT'].to_numpy()
+    bins = np.empty(len(data), dtype=np.int16)
+    for index in data.groupby(by).indices.values():
+        edges = np.quantile(rt[index], quantiles)
+        bins[index] = np.searchsorted(edges, rt[index], side='left')
+    return bins
+
+def calculate_percent_correct_by_quantile(empirical_data, simulated_data, quantiles=(0.25, 0.5, 0.75)):
+    """Percent correct per subject x Group x Session x RT quantile bin, empirical next to simulated.
+
+    Both datasets are binned (see assign_quantile_bins) and aggregated together in one grouped mean.
+    Returns one row per subject, Group, Session and bin with the columns 'response_empirical' and
+    'response_simulated'; only cells present in both datasets are kept.
+    """
+    data = pd.concat([empirical_data.assign(type='E'), simulated_data.assign(type='S')], ignore_index=True)
+    data['bin'] = assign_quantile_bins(data, quantiles)
+
+    percent_correct = data.groupby(['type'] + group_columns + ['bin'])['response'].mean() * 100
+    merged = percent_correct.unstack('type').dropna()
+    merged = merged.rename(columns={'E': 'response_empirical', 'S': 'response_simulated'})
+    merged.columns.name = None
+    return merged.reset_index()
+
 # Function to plot scatter plot on a given axes
 def plot_scatter(ax, data, x_col, y_col, x_label, y_label):
+    import seaborn as sns
+
     sns.scatterplot(data=data, x=x_col, y=y_col, hue='Session', style='Group', s=150, ax=ax)
     ax.plot([0, 100], [0, 100], linestyle='--', color='gray')
     ax.set_xlabel(x_label)
     ax.set_ylabel(y_label)
     ax.legend(title='Group/Session', loc='center left')
 
-# Calculate the RT quantiles for both datasets
-quantiles_empirical = empirical_data['RT'].quantile([0.25, 0.5, 0.75])
-quantiles_simulated = simulated_data['RT'].quantile([0.25, 0.5, 0.75])
-
-# Calculate the percent correct for both datasets
-empirical_percent_correct = calculate_percent_correct(empirical_data)
-simulated_percent_correct = calculate_percent_correct(simulated_data)
-merged_data = pd.merge(empirical_percent_correct, simulated_percent_correct, 
-                       on=['subject', 'Group', 'Session'], suffixes=('_empirical', '_simulated'))
-
-# Create a 2x2 grid of subplots
-fig, axs = plt.subplots(2, 2, figsize=(14, 12))
-
-# Overall percent correct scatterplot
-plot_scatter(axs[0, 0], merged_data, 'response_empirical', 'response_simulated', 'Empirical Data (% Correct)', 'Simulated Data (% Correct)')
-
-# Scatterplots for each quantile
-for i, q in enumerate([0.25, 0.5, 0.75]):
-    quantile_start_empirical = quantiles_empirical[q-0.25] if q > 0.25 else empirical_data['RT'].min()
-    quantile_end_empirical = quantiles_empirical[q]
-    quantile_start_simulated = quantiles_simulated[q-0.25] if q > 0.25 else simulated_data['RT'].min()
-    quantile_end_simulated = quantiles_simulated[q]
-
-    empirical_q_percent_correct = calculate_percent_correct_in_quantile(empirical_data, quantile_start_empirical, quantile_end_empirical)
-    simulated_q_percent_correct = calculate_percent_correct_in_quantile(simulated_data, quantile_start_simulated, quantile_end_simulated)
-    merged_q_data = pd.merge(empirical_q_percent_correct, simulated_q_percent_correct, 
-                             on=['subject', 'Group', 'Session'], suffixes=('_empirical', '_simulated'))
-    
-    ax_index = (i + 1) // 2, (i + 1) % 2
-    x_label = f'Empirical Data (% Correct) - {int(q*100)}% Quantile'
-    y_label = f'Simulated Data (% Correct) - {int(q*100)}% Quantile'
-    plot_scatter(axs[ax_index], merged_q_data, 'response_empirical', 'response_simulated', x_label, y_label)
-
-plt.tight_layout()
-plt.show()
+def plot_model_recovery(empirical_data, simulated_data, quantiles=(0.25, 0.5, 0.75)):
+    """Overall percent correct scatterplot plus one scatterplot per quantile bin, on a two-column grid."""
+    import matplotlib.pyplot as plt
+
+    # Calculate the percent correct for both datasets
+    empirical_percent_correct = calculate_percent_correct(empirical_data)
+    simulated_percent_correct = calculate_percent_correct(simulated_data)
+    merged_data = pd.merge(empirical_percent_correct, simulated_percent_correct,
+                           on=group_columns, suffixes=('_empirical', '_simulated'))
+    quantile_data = calculate_percent_correct_by_quantile(empirical_data, simulated_data, quantiles)
+
+    n_panels = 1 + len(quantiles)
+    n_rows = (n_panels + 1) // 2
+    fig, axs = plt.subplots(n_rows, 2, figsize=(14, 6 * n_rows), squeeze=False)
+    axs = axs.ravel()
+
+    # Overall percent correct scatterplot
+    plot_scatter(axs[0], merged_data, 'response_empirical', 'response_simulated', 'Empirical Data (% Correct)', 'Simulated Data (% Correct)')
+
+    # Scatterplots for each quantile
+    for i, q in enumerate(quantiles):
+        merged_q_data = quantile_data[quantile_data['bin'] == i]
+        x_label = f'Empirical Data (% Correct) - {q * 100:g}% Quantile'
+        y_label = f'Simulated Data (% Correct) - {q * 100:g}% Quantile'
+        plot_scatter(axs[i + 1], merged_q_data, 'response_empirical', 'response_simulated', x_label, y_label)
+
+    for ax in axs[n_panels:]:
+        ax.set_visible(False)
+
+    fig.tight_layout()
+    return fig
+
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
+    # Read the data files
+    empirical_data_path = r'C:\Users\Darren\Desktop\CODE\FASTDM\empirical_data.csv'
+    simulated_data_path = r'C:\Users\Darren\Desktop\CODE\FASTDM\simulated_data.csv'
+
+    empirical_data = pd.read_csv(empirical_data_path)
+    simulated_data = pd.read_csv(simulated_data_path)
+
+    # Rename 'Session' and 'Group' columns
+    empirical_data.rename(columns={'session': 'Session', 'group': 'Group'}, inplace=True)
+    simulated_data.rename(columns={'session': 'Session', 'group': 'Group'}, inplace=True)
+
+    plot_model_recovery(empirical_data, simulated_data, quantiles=[0.25, 0.5, 0.75])
+    plt.show()
@@ -0,0 +1,95 @@
+"""
+Fast reading of fast-dm simulation outputs (two whitespace-separated columns: RESPONSE and TIME, no header)
+and a compact binary store for them. The store holds all rows of a directory in two flat files
+(int8 responses, float32 RTs) plus a JSON index of the row range of every source file, and is memory-mapped on load.
+"""
+
+import io
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+store_files = {
+    'response': ('response.bin', np.int8),
+    'rt': ('rt.bin', np.float32),
+}
+index_file = 'index.json'
+
+
+def parse_fastdm_text(text):
+    """Parse the text of a fast-dm output file into (response int8, rt float32) arrays.
+
+    A leading '#' header line, as written by convertsimulationfiletype.py, is skipped. A malformed value or
+    a row without exactly two values raises ValueError (pandas' ParserError is one).
+    """
+    if text.startswith('#'):
+        text = text.split('\n', 1)[1] if '\n' in text else ''
+    if not text.strip():
+        return np.zeros(0, dtype=np.int8), np.zeros(0, dtype=np.float32)
+    values = pd.read_csv(io.StringIO(text), sep=r'\s+', header=None, dtype=np.float64, engine='c').to_numpy()
+    if values.shape[1] != 2 or np.isnan(values).any():
+        raise ValueError("Expected two columns (RESPONSE, TIME) in every row.")
+    return values[:, 0].astype(np.int8), values[:, 1].astype(np.float32)
+
+
+def read_fastdm_output(file_path):
+    """Read a fast-dm .dat/.lst/.txt output file into (response int8, rt float32) arrays in one bulk conversion."""
+    with open(file_path, 'r') as f:
+        return parse_fastdm_text(f.read())
+
+
+def convert_directory(source_directory, store_directory, pattern='*.dat'):
+    """Convert every file matching pattern in source_directory into one binary store in store_directory.
+
+    Files are converted one at a time and appended to the store, so memory use is bounded by the
+    largest file. Returns the index: file name -> [first row, end row].
+    """
+    store_path = Path(store_directory)
+    store_path.mkdir(parents=True, exist_ok=True)
+
+    index = {}
+    rows = 0
+    handles = {name: open(store_path / filename, 'wb') for name, (filename, dtype) in store_files.items()}
+    try:
+        for file_path in sorted(Path(source_directory).glob(pattern)):
+            response, rt = read_fastdm_output(file_path)
+            handles['response'].write(response.tobytes())
+            handles['rt'].write(rt.tobytes())
+            index[file_path.name] = [rows, rows + len(rt)]
+            rows += len(rt)
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    with open(store_path / index_file, 'w') as f:
+        json.dump({'rows': rows, 'files': index}, f, indent=1)
+    return index
+
+
+def load_store(store_directory):
+    """Memory-map a store written by convert_directory.
+
+    Returns (response, rt, index): two read-only arrays over all rows and the file name -> [start, stop] index.
+    """
+    store_path = Path(store_directory)
+    with open(store_path / index_file) as f:
+        index = json.load(f)
+
+    arrays = []
+    for name in ['response', 'rt']:
+        filename, dtype = store_files[name]
+        if index['rows'] == 0:
+            arrays.append(np.zeros(0, dtype=dtype))
+        else:
+            arrays.append(np.memmap(store_path / filename, dtype=dtype, mode='r', shape=(index['rows'],)))
+    return arrays[0], arrays[1], index['files']
+
+
+def read_store_file(store_directory, file_name):
+    """Return the (response, rt) arrays of one source file from a store, without reading the rest."""
+    response, rt, index = load_store(store_directory)
+    start, stop = index[os.path.basename(file_name)]
+    return response[start:stop], rt[start:stop]
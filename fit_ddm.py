@@ -0,0 +1,232 @@
+"""
+This script fits the diffusion model (a, v, t0, st0; start point z = a/2) to the corrected trial data in Python,
+instead of writing one file per participant for fast-dm and reading its parameters_*.txt files back.
+
+The first-passage time density is the series of Navarro & Fuss (2009), evaluated for all trials of a cell at
+once, with the small- or large-time expansion chosen per trial and the uniform st0 variability integrated by
+Gauss-Legendre quadrature. Cells (subject x session x condition) are fitted by maximum likelihood or by the
+Kolmogorov-Smirnov statistic, as in fast-dm, on a process pool; the KS fit reads the model CDF from the
+interpolated table of wiener_cache. The result is one parameter table in the
+format of params_summarizer (group, session, condition, subject, a, v, t0, st0), ready for simulate_ddm.
+
+    params = fit_ddm(corr_datasets['Raw Data Set'])
+"""
+
+import numpy as np
+import pandas as pd
+
+param_names = ['a', 'v', 't0', 'st0']
+id_columns = ['group', 'session', 'condition', 'subject']
+
+# (lower, upper) limits of the fitted parameters
+param_bounds = {'a': (0.3, 5.0), 'v': (-7.0, 7.0), 't0': (0.05, 3.0), 'st0': (0.0, 1.0)}
+
+# Smallest density used in the likelihood, so a single badly fitting trial cannot make it -inf
+density_floor = 1e-10
+
+quadrature_nodes, quadrature_weights = np.polynomial.legendre.leggauss(16)
+
+
+def standard_density(u, w, err=1e-8):
+    """Density of first passage through 0 at normalized time u for drift 0, boundary 1 and start w.
+
+    Uses the small-time series where it needs fewer terms than the large-time one (Navarro & Fuss, 2009),
+    with as many terms as the slowest trial needs for the error bound err. u <= 0 gives 0.
+    """
+    u = np.asarray(u, dtype=np.float64)
+    density = np.zeros_like(u)
+    positive = u > 0
+    u = u[positive]
+    if u.size == 0:
+        return density
+
+    # Number of terms for the large-time series
+    large_bound = np.pi * u * err
+    kl = np.where(large_bound < 1, np.sqrt(-2 * np.log(np.minimum(large_bound, 1 - 1e-16)) / (np.pi ** 2 * u)), 0)
+    kl = np.maximum(kl, 1 / (np.pi * np.sqrt(u)))
+    # Number of terms for the small-time series
+    small_bound = 2 * np.sqrt(2 * np.pi * u) * err
+    ks = np.where(small_bound < 1, 2 + np.sqrt(-2 * u * np.log(np.minimum(small_bound, 1 - 1e-16))), 2)
+    ks = np.maximum(ks, np.sqrt(u) + 1)
+    small = ks < kl
+
+    result = np.empty_like(u)
+    if small.any():
+        us = u[small]
+        n_terms = int(np.ceil(ks[small].max()))
+        k = np.arange(-((n_terms - 1) // 2), (n_terms - 1) // 2 + 1)
+        offsets = w + 2 * k[None, :]
+        result[small] = (offsets * np.exp(-offsets ** 2 / (2 * us[:, None]))).sum(axis=1) / np.sqrt(2 * np.pi * us ** 3)
+    if (~small).any():
+        ul = u[~small]
+        k = np.arange(1, int(np.ceil(kl[~small].max())) + 1)
+        result[~small] = np.pi * (k * np.exp(-k ** 2 * np.pi ** 2 * ul[:, None] / 2) * np.sin(k * np.pi * w)).sum(axis=1)
+
+    density[positive] = np.maximum(result, 0)
+    return density
+
+
+def wiener_density(t, a, v, w=0.5, response=0):
+    """First-passage density at decision time t through the lower (response 0) or upper (response 1) boundary."""
+    t = np.asarray(t, dtype=np.float64)
+    response = np.broadcast_to(np.asarray(response), t.shape)
+    # The upper boundary is the lower boundary of the mirrored process
+    v = np.where(response == 1, -v, v)
+    w = np.where(response == 1, 1 - w, w)
+    density = np.zeros_like(t)
+    for w_value in np.unique(w):
+        rows = w == w_value
+        density[rows] = (standard_density(t[rows] / a ** 2, w_value) / a ** 2
+                         * np.exp(-v[rows] * a * w_value - v[rows] ** 2 * t[rows] / 2))
+    return density
+
+
+def ddm_density(rt, response, a, v, t0, st0, z=0.5):
+    """Density of the observed RTs and responses, with non-decision time uniform on [t0 - st0/2, t0 + st0/2]."""
+    rt = np.asarray(rt, dtype=np.float64)
+    if st0 < 1e-6:
+        return wiener_density(rt - t0, a, v, z, response)
+    # Gauss-Legendre nodes over the non-decision time interval, all trials at once
+    non_decision = t0 + st0 / 2 * quadrature_nodes
+    decision = rt[:, None] - non_decision[None, :]
+    density = wiener_density(decision.ravel(), a, v, z, np.repeat(response, len(non_decision))).reshape(decision.shape)
+    return density @ quadrature_weights / 2
+
+
+def in_bounds(params):
+    a, v, t0, st0 = params
+    return (all(param_bounds[name][0] <= value <= param_bounds[name][1] for name, value in zip(param_names, params))
+            and t0 - st0 / 2 >= 0)
+
+
+def negative_log_likelihood(params, rt, response):
+    if not in_bounds(params):
+        return np.inf
+    density = ddm_density(rt, response, *params)
+    return -np.log(np.maximum(density, density_floor)).sum()
+
+
+def ks_statistic(params, rt, response, table=None):
+    """Kolmogorov-Smirnov distance between data and model, with lower responses as negative times (as fast-dm).
+
+    The model CDF is looked up in table (a wiener_cache.WienerTable; default: wiener_cache.default_table()).
+    """
+    if not in_bounds(params):
+        return np.inf
+    if table is None:
+        from wiener_cache import default_table
+        table = default_table()
+    a, v, t0, st0 = params
+    rt = np.asarray(rt, dtype=np.float64)
+    p_lower = 1 - table.accuracy(a, v)
+
+    # Signed times: -rt for lower responses, rt for upper ones; the CDF of the signed distribution at each trial
+    signed = np.where(response == 1, rt, -rt)
+    trial_cdf = table.cdf(rt, response, a, v, t0, st0)
+    model_cdf = np.where(response == 1, p_lower + trial_cdf, p_lower - trial_cdf)
+    order = np.argsort(signed)
+    empirical = np.arange(1, len(rt) + 1) / len(rt)
+    model_cdf = model_cdf[order]
+    return max(np.abs(empirical - model_cdf).max(), np.abs(empirical - 1 / len(rt) - model_cdf).max())
+
+
+def start_values(rt, response):
+    """EZ-diffusion estimates (Wagenmakers et al., 2007, with s = 1), clipped to the fitting bounds, as starting point."""
+    accuracy = np.mean(response)
+    sign = 1 if accuracy >= 0.5 else -1
+    accuracy = np.clip(max(accuracy, 1 - accuracy), 0.51, 0.99)
+    variance = max(np.var(rt), 1e-4)
+
+    logit = np.log(accuracy / (1 - accuracy))
+    v = (logit * (logit * accuracy ** 2 - logit * accuracy + accuracy - 0.5) / variance) ** 0.25
+    a = logit / v
+    mean_decision = a / (2 * v) * (1 - np.exp(-v * a)) / (1 + np.exp(-v * a))
+    t0 = np.mean(rt) - mean_decision
+    start = {'a': a, 'v': sign * v, 't0': t0, 'st0': 0.1}
+    return [float(np.clip(start[name], *param_bounds[name])) for name in param_names]
+
+
+def fit_cell(rt, response, method='ml'):
+    """Fit one cell's trials; returns a dict with a, v, t0, st0, the objective value and the number of trials.
+
+    method is 'ml' (maximum likelihood) or 'ks' (Kolmogorov-Smirnov). Nelder-Mead is started at the
+    EZ-diffusion estimates and restarted once from its own result.
+    """
+    from scipy.optimize import minimize
+
+    if method not in ('ml', 'ks'):
+        raise ValueError(f"Unknown method {method!r}: use 'ml' or 'ks'.")
+    objective = negative_log_likelihood if method == 'ml' else ks_statistic
+    rt = np.asarray(rt, dtype=np.float64)
+    response = np.asarray(response, dtype=np.int8)
+
+    params = start_values(rt, response)
+    # Start t0 below the fastest RT (where the bounds allow it), so every trial has some density
+    params[2] = max(min(params[2], 0.9 * rt.min()), param_bounds['t0'][0])
+    params[3] = min(params[3], params[2])
+    for _ in range(2):
+        result = minimize(objective, params, args=(rt, response), method='Nelder-Mead',
+                          options={'xatol': 1e-4, 'fatol': 1e-6, 'maxiter': 2000})
+        params = list(result.x)
+
+    fit = dict(zip(param_names, map(float, params)))
+    fit.update({'objective': float(result.fun), 'method': method, 'n_trials': len(rt), 'converged': bool(result.success)})
+    return fit
+
+
+def _fit_job(args):
+    key, rt, response, method = args
+    try:
+        return key, fit_cell(rt, response, method)
+    except Exception as e:
+        print(f"Error fitting {key}: {e}")
+        return key, None
+
+
+def fit_ddm(data, method='ml', subject='subj_idx', group='GROUP', session='SESSION', condition='CONDITION',
+            rt_column='TIME', response_column='RESPONSE', processes=None):
+    """Fit every subject x session x condition cell of the corrected data and return one parameter table.
+
+    The identifiers are written as params_summarizer writes them (group normalized as in empsim_compiler,
+    lower-case condition, session 's1', subject 'pt_0001'), so the table can go straight to
+    simulate_ddm.run_simulation_driver.
+    Cells whose fit fails are left out. With processes set, cells are fitted on a process pool.
+    """
+    from empsim_compiler import normalize_group
+
+    columns = [group, session, condition, subject]
+    jobs = []
+    for key, cell in data.groupby(columns, observed=True, sort=True):
+        jobs.append((key, cell[rt_column].to_numpy(dtype=np.float64), cell[response_column].to_numpy(dtype=np.int8),
+                     method))
+
+    if processes:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_fit_job, jobs))
+    else:
+        results = [_fit_job(job) for job in jobs]
+
+    rows = []
+    for (group_name, session_name, condition_name, subject_name), fit in results:
+        if fit is None:
+            continue
+        row = {
+            'group': normalize_group(group_name),
+            'session': f's{session_name}',
+            'condition': str(condition_name).lower(),
+            'subject': 'pt_' + str(subject_name).strip('PT'),
+        }
+        row.update(fit)
+        rows.append(row)
+    return pd.DataFrame(rows, columns=id_columns + param_names + ['objective', 'method', 'n_trials', 'converged'])
+
+
+if __name__ == '__main__':
+    # Set the corrected data written by main.py and the output table
+    corrected_path = r"C:\Users\Darren\Desktop\CODE\FASTDM\raw_corrected.csv"
+    output_path = r"C:\Users\Darren\Desktop\CODE\FASTDM\params_for_simulation.txt"
+
+    params = fit_ddm(pd.read_csv(corrected_path), processes=4)
+    params.to_csv(output_path, sep='\t', index=False)
+    print(f"Fitted {len(params)} cells into {output_path}")
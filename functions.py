@@ -1,13 +1,12 @@
 # -*- coding: utf-8 -*-
 """
 Script for pre-processing functions. Handles tasks such as checking for missing values, analyzing response distributions, and generating various plots.
+matplotlib and tkinter are imported inside the plotting functions, so the checks and outlier removal start without them.
 """
 
 import os
-import copy
-import matplotlib.pyplot as plt
-import tkinter as tk
-from tkinter import filedialog
+import numpy as np
+import pandas as pd
 
 
 
@@ -43,25 +42,115 @@ def count_response_values(datasets):
 
     return value_counts
 
-def remove_z_outliers(dataset, threshold=3):
-    z_dataset = copy.deepcopy(dataset)
-    
+def z_outlier_masks(dataset, threshold=3, group_by=None, rt_floor=0.1):
+    """Compute boolean keep-masks for z-score and RT floor outlier removal without copying any data.
+
+    With group_by=None one z-score is computed over each whole dataset (as before). With group_by set to
+    a column name or list of column names (e.g. 'subj_idx' or ['subj_idx', 'CONDITION', 'SESSION']) the
+    z-scores are computed per group in a single groupby pass; a group with one trial or no RT variance
+    has no z-score, so only the RT floor applies to it. In the global mode such a dataset is removed
+    entirely, as before.
+
+    Returns (masks, removed_counts): per dataset key a boolean Series that is True for trials to keep,
+    and the removed trials: a Series of counts per group, or an int in the global mode.
+    """
+    if isinstance(group_by, str):
+        group_by = [group_by]
+
+    masks = {}
+    removed_counts = {}
     for key, df in dataset.items():
-       
-        # Filter based on z-scores
-        z_scores = (df['rt'] - df['rt'].mean()) / df['rt'].std()
-        z_filtered_data = df[abs(z_scores) <= threshold]
-        
-        # Further filter based on 'rt' value
-        value_filtered_data = z_filtered_data[z_filtered_data['rt'] > 0.1] #filter out trials 100ms and below
-        
-
-        # Update the z_dataset with the final filtered data
-        z_dataset[key] = value_filtered_data
+        rt = df['rt']
+
+        if group_by:
+            grouped = rt.groupby([df[col] for col in group_by], observed=True, sort=False)
+            z_scores = ((rt - grouped.transform('mean')) / grouped.transform('std')).fillna(0)
+        else:
+            z_scores = (rt - rt.mean()) / rt.std()
+
+        # Filter based on z-scores and 'rt' value (missing RTs fail the floor)
+        keep = (z_scores.abs() <= threshold) & (rt > rt_floor) #filter out trials 100ms and below
+        masks[key] = keep
+
+        if group_by:
+            removed_counts[key] = (~keep).groupby([df[col] for col in group_by], observed=True).sum().rename('removed')
+        else:
+            removed_counts[key] = int((~keep).sum())
 
+    return masks, removed_counts
+
+
+def remove_z_outliers(dataset, threshold=3, group_by=None, rt_floor=0.1, return_counts=False):
+    """Return a new dict with the z-score and RT floor outliers removed from every dataset.
+
+    The input dataframes are left untouched; see z_outlier_masks for the meaning of group_by.
+    With return_counts=True the per-group removed counts are returned as well.
+    """
+    masks, removed_counts = z_outlier_masks(dataset, threshold, group_by, rt_floor)
+    z_dataset = {key: df[masks[key]] for key, df in dataset.items()}
+
+    if return_counts:
+        return z_dataset, removed_counts
     return z_dataset
 
+
+def qc_report(dataset, removed_counts=None, rt_column='rt', response_column='response', subject_column='subj_idx',
+              quantiles=(0.1, 0.25, 0.5, 0.75, 0.9)):
+    """Quality-control statistics of every dataset, computed together instead of by separate scans.
+
+    Per dataset key: the number of rows, missing values per column, response value counts, RT mean, std,
+    min, max and quantiles (from one sorted copy of the RTs), and the trial count per subject. Pass the
+    removed_counts of remove_z_outliers(..., return_counts=True) to include the outliers removed per
+    dataset instead of recomputing them. Returns a JSON-serializable dict; see print_qc_report.
+    """
+    report = {}
+    for key, df in dataset.items():
+        entry = {'rows': len(df), 'missing_values': {col: int(n) for col, n in df.isna().sum().items()}}
+
+        if response_column in df.columns:
+            values, counts = np.unique(df[response_column].dropna().to_numpy(), return_counts=True)
+            entry['response_counts'] = {str(value): int(count) for value, count in zip(values, counts)}
+
+        if rt_column in df.columns:
+            rt = np.sort(df[rt_column].dropna().to_numpy(dtype=np.float64))
+            if len(rt):
+                entry['rt'] = {
+                    'mean': float(rt.mean()),
+                    'std': float(rt.std(ddof=1)) if len(rt) > 1 else float('nan'),
+                    'min': float(rt[0]),
+                    'max': float(rt[-1]),
+                    'quantiles': {str(q): float(value) for q, value in zip(quantiles, np.quantile(rt, quantiles))},
+                }
+
+        if subject_column in df.columns:
+            trials = df[subject_column].value_counts(sort=False)
+            entry['trials_per_subject'] = {str(subject): int(n) for subject, n in trials.items() if n > 0}
+
+        if removed_counts is not None and key in removed_counts:
+            removed = removed_counts[key]
+            entry['outliers_removed'] = int(removed) if np.ndim(removed) == 0 else int(removed.sum())
+        report[key] = entry
+    return report
+
+
+def print_qc_report(report):
+    # The same information the separate checks printed, from a qc_report result
+    for key, entry in report.items():
+        missing = {col: n for col, n in entry['missing_values'].items() if n > 0}
+        print(f"Dataset -'{key}': {entry['rows']} rows"
+              + (f", {entry['outliers_removed']} outliers removed" if 'outliers_removed' in entry else ''))
+        print(f"  Missing values: {missing if missing else 'none'}")
+        if 'response_counts' in entry:
+            print(f"  Response counts: {entry['response_counts']}")
+        if 'rt' in entry:
+            print(f"  RT mean {entry['rt']['mean']:.3f}, std {entry['rt']['std']:.3f}, "
+                  f"min {entry['rt']['min']:.3f}, max {entry['rt']['max']:.3f}")
+
+
 def plot_group_rt(dataset, corr_dataset):
+    import tkinter as tk
+    from tkinter import filedialog
+
     root = tk.Tk()
     root.wm_attributes("-topmost", 1)
     root.withdraw()
@@ -70,43 +159,59 @@ def plot_group_rt(dataset, corr_dataset):
     plot_histograms_side_by_side(dataset, corr_dataset, folder_path)
 
 
-def plot_histograms_side_by_side(dataset, corr_dataset, folder_path):
-    columns = ['rt']
-    for key in dataset:
-        if key in corr_dataset:  # Ensures that the same key exists in both datasets
-            fig, axes = plt.subplots(1, 2, figsize=(16, 6))  # 1 row, 2 columns
+def save_figure(fig, figure_path):
+    # Ensure directory exists
+    dir_to_create = os.path.dirname(figure_path)
+    if dir_to_create and not os.path.exists(dir_to_create):
+        os.makedirs(dir_to_create, exist_ok=True)
 
-            for i, current_dataset in enumerate([dataset, corr_dataset]):
-                df = current_dataset[key]
-                correct_choices = df[df['response'] == 1]
-                incorrect_choices = df[df['response'] == 0]
+    fig.savefig(figure_path)
+    print(f"Successfully saved figure to: {figure_path}")
+
+
+def show_and_close(fig, show=True):
+    import matplotlib.pyplot as plt
+
+    if show:
+        plt.show()
+    plt.close(fig)
 
-                axes[i].hist(correct_choices['rt'], bins='auto', alpha=0.5, label='Correct Choice')
-                axes[i].hist(incorrect_choices['rt'], bins='auto', alpha=0.5, label='Incorrect Choice')
-                axes[i].set_xlabel('Response Time (s)')
-                axes[i].set_ylabel('Frequency')
-                axes[i].legend()
-                axes[i].spines['top'].set_visible(False)
-                axes[i].spines['right'].set_visible(False)
-                #axes[i].set_title(f"{'Uncorrected' if i == 0 else 'Corrected'} - {key}")
 
-            plt.tight_layout()
+def draw_histograms_side_by_side(df, corr_df):
+    import matplotlib.pyplot as plt
 
-            figure_path = f"{folder_path}/{key}_GroupRTs_Comparison.png"
-            
-            # Ensure directory exists
-            dir_to_create = os.path.dirname(figure_path)
-            if not os.path.exists(dir_to_create):
-                os.makedirs(dir_to_create)
-            
-            plt.savefig(figure_path)
-            print(f"Successfully saved figure to: {figure_path}")
+    fig, axes = plt.subplots(1, 2, figsize=(16, 6))  # 1 row, 2 columns
 
-            plt.show()
+    for i, current_df in enumerate([df, corr_df]):
+        correct_choices = current_df[current_df['response'] == 1]
+        incorrect_choices = current_df[current_df['response'] == 0]
+
+        axes[i].hist(correct_choices['rt'], bins='auto', alpha=0.5, label='Correct Choice')
+        axes[i].hist(incorrect_choices['rt'], bins='auto', alpha=0.5, label='Incorrect Choice')
+        axes[i].set_xlabel('Response Time (s)')
+        axes[i].set_ylabel('Frequency')
+        axes[i].legend()
+        axes[i].spines['top'].set_visible(False)
+        axes[i].spines['right'].set_visible(False)
+        #axes[i].set_title(f"{'Uncorrected' if i == 0 else 'Corrected'} - {key}")
+
+    fig.tight_layout()
+    return fig
+
+
+def plot_histograms_side_by_side(dataset, corr_dataset, folder_path, show=True):
+    for key in dataset:
+        if key in corr_dataset:  # Ensures that the same key exists in both datasets
+            fig = draw_histograms_side_by_side(dataset[key], corr_dataset[key])
+            save_figure(fig, f"{folder_path}/{key}_GroupRTs_Comparison.png")
+            show_and_close(fig, show)
 
 
 
 def plot_subject_rt(dataset, corr_dataset):
+    import tkinter as tk
+    from tkinter import filedialog
+
     root = tk.Tk()
     root.wm_attributes("-topmost", 1)
     root.withdraw()
@@ -115,38 +220,74 @@ def plot_subject_rt(dataset, corr_dataset):
     plot_histogram_for_subject(dataset, folder_path, '- with Outliers')
     plot_histogram_for_subject(corr_dataset, folder_path, '- Corrected')
 
+def subject_histograms(data, bins=30):
+    """Count every subject's correct and incorrect response times in one vectorized pass.
+
+    All subjects share one array of bin edges spanning the RT range. Returns a dict with the sorted
+    'subjects', the bin 'edges' and 'counts' of shape (subjects, 2, bins), where counts[:, 0] are the
+    incorrect (response 0) and counts[:, 1] the correct (response 1) trials. Plotting or exporting
+    from this dict never rescans the trials; see save_subject_histograms to keep it on disk.
+    """
+    subject_codes, subjects = pd.factorize(data['subj_idx'], sort=True)
+    response = data['response'].to_numpy()
+    rt = data['rt'].to_numpy(dtype=float)
+
+    keep = (response == 0) | (response == 1)
+    edges = np.histogram_bin_edges(rt[keep], bins=bins)
+    bin_index = np.clip(np.searchsorted(edges, rt[keep], side='right') - 1, 0, bins - 1)
+
+    flat_index = (subject_codes[keep] * 2 + response[keep].astype(np.int64)) * bins + bin_index
+    counts = np.bincount(flat_index, minlength=len(subjects) * 2 * bins).reshape(len(subjects), 2, bins)
+
+    return {'subjects': np.asarray(subjects, dtype=str), 'edges': edges, 'counts': counts.astype(np.int32)}
+
+
+def save_subject_histograms(histograms, file_path):
+    np.savez_compressed(file_path, **histograms)
+
+
+def load_subject_histograms(file_path):
+    with np.load(file_path) as stored:
+        return {name: stored[name] for name in stored.files}
+
+
 # this version generates 1 plot for 0 on negative x and 1 on positive x
-def plot_histogram_for_subject(datasets, folder_path, suffix):
-    for key, data in datasets.items():
-        fig = plt.figure(figsize=(8, 6))
-        ax = fig.add_subplot(111, xlabel='Incorrect vs Correct Choice Response Times (s)', ylabel='Frequency', title=f"Histogram of Response Times {suffix}")
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        
-        
-        for i, subj_idx in data.groupby('subj_idx'):
-            rt_correct = subj_idx[subj_idx['response'] == 1]['rt']
-            rt_incorrect = -subj_idx[subj_idx['response'] == 0]['rt']
-            
-            rt_correct.hist(bins=30, histtype='step', ax=ax)
-            rt_incorrect.hist(bins=30, histtype='step', ax=ax)
-
-        plt.grid(None)
-
-        figure_path = f"{folder_path}/{key}_subjectRTs_{suffix}.pdf"
-
-        # Ensure directory exists
-        dir_to_create = os.path.dirname(figure_path)
-        if not os.path.exists(dir_to_create):
-            os.makedirs(dir_to_create)
-
-        plt.savefig(figure_path)
-        print(f"Successfully saved figure to: {figure_path}")
+def draw_histogram_for_subject(data, suffix):
+    """Draw every subject's RT histogram (incorrect mirrored to negative x) from trials or from subject_histograms."""
+    import matplotlib.pyplot as plt
 
-        plt.show()
+    histograms = data if isinstance(data, dict) else subject_histograms(data)
+    edges = histograms['edges']
+    counts = histograms['counts']
+
+    fig = plt.figure(figsize=(8, 6))
+    ax = fig.add_subplot(111, xlabel='Incorrect vs Correct Choice Response Times (s)', ylabel='Frequency', title=f"Histogram of Response Times {suffix}")
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+
+    if len(counts):
+        # One step outline per subject; each bin is represented by its left edge and weighted by its count
+        n_subjects = len(counts)
+        correct_x = np.repeat(edges[:-1, None], n_subjects, axis=1)
+        incorrect_x = np.repeat(-edges[:0:-1, None], n_subjects, axis=1)
+        ax.hist(correct_x, bins=edges, weights=counts[:, 1, :].T, histtype='step')
+        ax.hist(incorrect_x, bins=-edges[::-1], weights=counts[:, 0, ::-1].T, histtype='step')
+
+    ax.grid(False)
+    return fig
+
+
+def plot_histogram_for_subject(datasets, folder_path, suffix, show=True):
+    for key, data in datasets.items():
+        fig = draw_histogram_for_subject(data, suffix)
+        save_figure(fig, f"{folder_path}/{key}_subjectRTs_{suffix}.pdf")
+        show_and_close(fig, show)
 
 
 def plot_boxplots(dataset, corr_dataset):
+    import tkinter as tk
+    from tkinter import filedialog
+
     root = tk.Tk()
     root.wm_attributes("-topmost", 1)
     root.withdraw()
@@ -156,30 +297,30 @@ def plot_boxplots(dataset, corr_dataset):
     plot_boxplots_for_datset(corr_dataset, folder_path, '- Corrected')
 
 
-def plot_boxplots_for_datset(dataset, folder_path, suffix):
-    for key, df in dataset.items():
-        fig, ax = plt.subplots(figsize=(8, 6))
-        data = [df[df['response'] == i]['rt'] for i in [0, 1]]
+def draw_boxplots(df, suffix):
+    import matplotlib.pyplot as plt
 
-        ax.boxplot(data, labels=['Incorrect Choice', 'Correct Choice'])
-        ax.set_ylabel('Response Time (s)')
-        ax.set_title(f'Boxplot of Response Times {suffix}')
+    fig, ax = plt.subplots(figsize=(8, 6))
+    data = [df[df['response'] == i]['rt'] for i in [0, 1]]
 
-        plt.tight_layout()
+    ax.boxplot(data, labels=['Incorrect Choice', 'Correct Choice'])
+    ax.set_ylabel('Response Time (s)')
+    ax.set_title(f'Boxplot of Response Times {suffix}')
 
-        figure_path = f"{folder_path}/{key}_Boxplot{suffix}.pdf"
-        
-        # Ensure directory exists
-        dir_to_create = os.path.dirname(figure_path)
-        if not os.path.exists(dir_to_create):
-            os.makedirs(dir_to_create)
-        
-        plt.savefig(figure_path)
-        print(f"Successfully saved figure to: {figure_path}")
+    fig.tight_layout()
+    return fig
 
-        plt.show()
+
+def plot_boxplots_for_datset(dataset, folder_path, suffix, show=True):
+    for key, df in dataset.items():
+        fig = draw_boxplots(df, suffix)
+        save_figure(fig, f"{folder_path}/{key}_Boxplot{suffix}.pdf")
+        show_and_close(fig, show)
 
 def plot_violinplots(dataset, corr_dataset):
+    import tkinter as tk
+    from tkinter import filedialog
+
     root = tk.Tk()
     root.wm_attributes("-topmost", 1)
     root.withdraw()
@@ -189,28 +330,100 @@ def plot_violinplots(dataset, corr_dataset):
     plot_violinplots_for_dataset(corr_dataset, folder_path, '- Corrected')
 
 
-def plot_violinplots_for_dataset(dataset, folder_path, suffix):
-    for key, df in dataset.items():
-        fig, ax = plt.subplots(figsize=(8, 6))
-        data = [df[df['response'] == i]['rt'] for i in [0, 1]]
-
-        ax.violinplot(data, showmedians=True)
-        ax.set_xticks([1, 2])
-        ax.set_xticklabels(['Incorrect Choices', 'Correct Choices'])
-        ax.set_ylabel('Response Time (s)')
-        ax.set_title(f'Violinplot of Response Times {suffix}')
-
-        plt.tight_layout()
-
-        figure_path = f"{folder_path}/{key}_Violinplot{suffix}.pdf"
-        
-        # Ensure directory exists
-        dir_to_create = os.path.dirname(figure_path)
-        if not os.path.exists(dir_to_create):
-            os.makedirs(dir_to_create)
-        
-        plt.savefig(figure_path)
-        print(f"Successfully saved figure to: {figure_path}")
+def draw_violinplots(df, suffix):
+    import matplotlib.pyplot as plt
 
-        plt.show()
+    fig, ax = plt.subplots(figsize=(8, 6))
+    data = [df[df['response'] == i]['rt'] for i in [0, 1]]
+
+    ax.violinplot(data, showmedians=True)
+    ax.set_xticks([1, 2])
+    ax.set_xticklabels(['Incorrect Choices', 'Correct Choices'])
+    ax.set_ylabel('Response Time (s)')
+    ax.set_title(f'Violinplot of Response Times {suffix}')
 
+    fig.tight_layout()
+    return fig
+
+
+def plot_violinplots_for_dataset(dataset, folder_path, suffix, show=True):
+    for key, df in dataset.items():
+        fig = draw_violinplots(df, suffix)
+        save_figure(fig, f"{folder_path}/{key}_Violinplot{suffix}.pdf")
+        show_and_close(fig, show)
+
+
+# Headless, parallel rendering
+figure_kinds = ['group_rt', 'subject_rt', 'boxplot', 'violinplot']
+
+
+def figure_jobs(dataset, corr_dataset, kinds=figure_kinds):
+    """List the figures the plot_* functions would draw, as (kind, filename stem, draw args) jobs.
+
+    Only the 'rt', 'response' and 'subj_idx' columns are kept, so little data is sent to worker processes.
+    """
+    columns = ['rt', 'response', 'subj_idx']
+    def slim(df):
+        return df[[col for col in columns if col in df.columns]]
+
+    jobs = []
+    if 'group_rt' in kinds:
+        for key in dataset:
+            if key in corr_dataset:
+                jobs.append(('group_rt', f"{key}_GroupRTs_Comparison", (slim(dataset[key]), slim(corr_dataset[key]))))
+    for current_dataset, suffix in [(dataset, '- with Outliers'), (corr_dataset, '- Corrected')]:
+        for key, df in current_dataset.items():
+            if 'subject_rt' in kinds:
+                jobs.append(('subject_rt', f"{key}_subjectRTs_{suffix}", (subject_histograms(df), suffix)))
+            if 'boxplot' in kinds:
+                jobs.append(('boxplot', f"{key}_Boxplot{suffix}", (slim(df), suffix)))
+            if 'violinplot' in kinds:
+                jobs.append(('violinplot', f"{key}_Violinplot{suffix}", (slim(df), suffix)))
+    return jobs
+
+
+def _use_agg_backend():
+    import matplotlib.pyplot as plt
+    plt.switch_backend('Agg')
+
+
+def _render_job(job, folder_path, formats):
+    import matplotlib.pyplot as plt
+
+    kind, stem, args = job
+    draw = {
+        'group_rt': draw_histograms_side_by_side,
+        'subject_rt': draw_histogram_for_subject,
+        'boxplot': draw_boxplots,
+        'violinplot': draw_violinplots,
+    }[kind]
+
+    fig = draw(*args)
+    try:
+        paths = []
+        for file_format in formats:
+            figure_path = os.path.join(folder_path, f"{stem}.{file_format}")
+            fig.savefig(figure_path)
+            paths.append(figure_path)
+    finally:
+        plt.close(fig)
+    return [{'kind': kind, 'figure': stem, 'path': path} for path in paths]
+
+
+def render_figures(dataset, corr_dataset, folder_path, kinds=figure_kinds, formats=('png',), processes=None):
+    """Render the plot_* figures headlessly (Agg backend) on a process pool and write them to folder_path.
+
+    Nothing is shown and every figure is closed after saving. Returns a manifest: one dict per written
+    file with the figure kind, the filename stem and the path.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+
+    os.makedirs(folder_path, exist_ok=True)
+    jobs = figure_jobs(dataset, corr_dataset, kinds)
+
+    manifest = []
+    with ProcessPoolExecutor(max_workers=processes, initializer=_use_agg_backend) as executor:
+        for written in executor.map(partial(_render_job, folder_path=folder_path, formats=formats), jobs):
+            manifest.extend(written)
+    return manifest
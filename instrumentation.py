@@ -0,0 +1,163 @@
+"""
+This script records where the time and memory of a preprocessing run go.
+
+A Recorder times every stage it is given (wall and CPU time), measures its memory (peak RSS of the process and,
+optionally, the peak Python allocation traced by tracemalloc) and counts the rows going in and out per dataset
+key. The records are written as one JSON report per run; with profile=True the stages are also run under cProfile
+and the statistics are saved next to the report.
+
+Pass a Recorder as config['recorder'] to load_data.run_pipeline, or wrap single functions with Recorder.wrap:
+    recorder = Recorder()
+    remove_z_outliers = recorder.wrap('remove_z_outliers', fn.remove_z_outliers)
+"""
+
+import contextlib
+import cProfile
+import functools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def count_rows(data):
+    """Rows of a dataframe, or dataset key -> rows for a dict of dataframes; None for anything else."""
+    if isinstance(data, dict):
+        rows = {key: len(df) for key, df in data.items() if hasattr(df, 'shape')}
+        return rows or None
+    if hasattr(data, 'shape'):
+        return len(data)
+    return None
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (None where the resource module is missing)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+class Recorder:
+    def __init__(self, trace_memory=True, profile=False):
+        """trace_memory turns on tracemalloc during stages (exact Python allocation peaks, but slower);
+        profile runs the outermost stages under cProfile."""
+        self.records = []
+        self.trace_memory = trace_memory
+        self.profiler = cProfile.Profile() if profile else None
+        self.started = time.time()
+        self._depth = 0
+        # Traced peak of each open stage so far, kept across the resets of its nested stages
+        self._peaks = []
+
+    @contextlib.contextmanager
+    def stage(self, name, key=None, data=None):
+        """Measure the enclosed block as stage name (for dataset key) and yield its record.
+
+        data, a dataframe or dict of dataframes, gives the rows in. Rows out are counted on the same
+        object at the end (right for functions that change the dict in place), unless the block sets
+        record['rows_out'] itself, e.g. record['rows_out'] = count_rows(result).
+        """
+        record = {'stage': name, 'key': key, 'rows_in': count_rows(data), 'rows_out': None}
+
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif self.trace_memory and hasattr(tracemalloc, 'reset_peak'):
+            # Save the enclosing stage's peak so far before resetting it for this stage
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._peaks.append(0)
+        traced_start = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        if self.profiler is not None and self._depth == 0:
+            self.profiler.enable()
+        self._depth += 1
+
+        rss_start = peak_rss_mb()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = time.perf_counter() - wall_start
+            record['cpu_s'] = time.process_time() - cpu_start
+
+            self._depth -= 1
+            if self.profiler is not None and self._depth == 0:
+                self.profiler.disable()
+
+            record['peak_rss_mb'] = peak_rss_mb()
+            record['rss_growth_mb'] = None if rss_start is None else record['peak_rss_mb'] - rss_start
+            record['traced_peak_mb'] = None
+            peak = self._peaks.pop()
+            if tracemalloc.is_tracing():
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                # The enclosing stage's peak includes this one's
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+            # A nested stage cannot reset the peak before Python 3.9, so it gets no traced peak there
+            if traced_start is not None and (started_tracing or hasattr(tracemalloc, 'reset_peak')):
+                record['traced_peak_mb'] = (peak - traced_start) / (1 << 20)
+            if started_tracing:
+                tracemalloc.stop()
+
+            if record['rows_out'] is None and data is not None:
+                record['rows_out'] = count_rows(data)
+            self.records.append(record)
+
+    def wrap(self, name, func):
+        """Return func measured as stage name on every call.
+
+        Rows in are counted on the first dataframe or dict of dataframes argument, rows out on the result
+        (or on the same argument if the function returns nothing, as the in-place load_data helpers do).
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            data = next((arg for arg in list(args) + list(kwargs.values()) if count_rows(arg) is not None), None)
+            with self.stage(name, data=data) as record:
+                result = func(*args, **kwargs)
+                # Functions like remove_z_outliers(..., return_counts=True) return the data first
+                output = result[0] if isinstance(result, tuple) and result else result
+                if count_rows(output) is not None:
+                    record['rows_out'] = count_rows(output)
+            return result
+        return wrapper
+
+    def summary(self):
+        """Total wall and CPU time and number of calls per stage name."""
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record['stage'], {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0})
+            total['calls'] += 1
+            total['wall_s'] += record['wall_s']
+            total['cpu_s'] += record['cpu_s']
+        return totals
+
+    def report(self):
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'stages': self.records,
+            'summary': self.summary(),
+        }
+
+    def save_report(self, report_path):
+        """Write the JSON report to report_path, and the cProfile statistics to report_path + '.prof' if profiling."""
+        with open(report_path, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+        if self.profiler is not None:
+            self.profiler.dump_stats(str(report_path) + '.prof')
+        return report_path
+
+    def print_summary(self):
+        for name, total in sorted(self.summary().items(), key=lambda item: -item[1]['wall_s']):
+            print(f"{name}: {total['wall_s']:.3f} s wall, {total['cpu_s']:.3f} s CPU over {total['calls']} call(s)")
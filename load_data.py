@@ -2,28 +2,31 @@
 """
 This script is used for loading and preprocessing data files for analysis.
 It features functions for selecting files, mapping them to dataset names, cleaning the data, and performing initial data checks.
+
+Importing this module has no side effects: no Tk windows are opened and nothing is printed.
+Use run_pipeline(config) to load and clean the datasets with explicit paths (e.g. from a batch job),
+or run this file directly to select the data folder and files through dialogs as before.
 """
+import contextlib
+import glob
+import hashlib
+import json
 import os
-import tkinter as tk
-from tkinter import filedialog
-
-import hddm
-
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
+import pandas as pd
 
-# Initialization
-root = tk.Tk()
-root.wm_attributes("-topmost", 1)  # Set the window to be always on top
-root.withdraw()  # Hide the root window
+from csv_reader import downcast_columns as downcast_frame_columns
+from csv_reader import projected_columns, read_csv_projected
 
-# Prompt user to select a folder
-directory = filedialog.askdirectory(title='Select Data Folder')
 
 # Datasets mapping
 # data_files = {
 #     'Full Data Set':'Avg.csv',
 #     'Baseline_SPL': 'Both_S1_SPL_Avg.csv', #baseline data, both groups should perform similar
-#     'Baseline_SHAM': 'Both_S1_SHAM_Avg.csv', 
+#     'Baseline_SHAM': 'Both_S1_SHAM_Avg.csv',
 #     'Baseline_VMPFC': 'Both_S1_VMPFC_Avg.csv',
 #     'Gut_SHAM_WS': 'Prbtc_S1S2_SHAM_Avg.csv', #gut sham data, should show GBA effect overtime
 #     'Gut_SHAM_BS': 'Both_S2_SHAM_Avg.csv',
@@ -41,9 +44,6 @@ data_files = {
     # 'Session 2 Data': 'S2_BothGroups_Raw.csv'
     }
 
-reverse_data_files = {filename: name for name, filename in data_files.items()}
-
-datasets = {}
 data_types = {
     "PARTICIPANT": 'str',
     "REP": 'category',
@@ -54,24 +54,203 @@ data_types = {
     "CLUSTERS": 'category'
 }
 
+# Exclusions applied as (column, values to remove)
+exclusions = [
+    ('CONCLUDED', ['DROPOUT']), #remove all subjects registered as dropouts
+    ('PARTICIPANT', ['PT0015', 'PT0034', 'PT0053', 'PT0057', 'PT0060', 'PT0062']), # these subjects removed because of either not fully completing placebo/probiotic protcol or substantial data recording issues
+]
+
+columns_to_remove = ['REP','SESSIONCOMPLETE','NrOfPink','TokenLoc','BettingValuePink',
+                     'BettingValueBlue','TRIALCODE','TrialOnset','ResponseTime',
+                     'ValidTrial','ProbPink','ProbBlue','TRIAL HANDLE','EVPINK',
+                     'EVBLUE','EVDIFF','EV.PICKED','VARPINK','VARBLUE','VARDIFF',
+                     'VARPICKED'] #not needed, saves filespace
+
+column_replacements = {
+    'PARTICIPANT': 'subj_idx',
+    'NetRT': 'rt',
+    'HEVC': 'response'
+}
+
+downcast_columns = ['NetRT', 'HEVC'] # become 'rt' (float32) and 'response' (int8 when all values are whole numbers)
+
+# Analysis datasets as subsets of the raw data set: name -> {column: values to keep}, matched case-insensitively.
+# They replace the separate *_Avg.csv exports above (the views hold trials; average them with groupby if needed)
+dataset_views = {
+    'Session 1 Data': {'SESSION': [1]},
+    'Session 2 Data': {'SESSION': [2]},
+    'Baseline_SPL': {'SESSION': [1], 'CONDITION': ['SPL']}, #baseline data, both groups should perform similar
+    'Baseline_SHAM': {'SESSION': [1], 'CONDITION': ['SHAM']},
+    'Baseline_VMPFC': {'SESSION': [1], 'CONDITION': ['VMPFC']},
+    'Gut_SHAM_WS': {'GROUP': ['PROBIOTICS'], 'CONDITION': ['SHAM']}, #gut sham data, should show GBA effect overtime
+    'Gut_SHAM_BS': {'SESSION': [2], 'CONDITION': ['SHAM']},
+    'Gut_SPL_WS': {'GROUP': ['PROBIOTICS'], 'CONDITION': ['SPL']}, #gut spl data, should not interfere with GBA effect
+    'Gut_SPL_BS': {'SESSION': [2], 'CONDITION': ['SPL']},
+    'TMS_preGut': {'SESSION': [1], 'CONDITION': ['SHAM', 'VMPFC']}, #tms_preGut data, should show effect of cTBS on MGT
+    'TMS_postGut': {'GROUP': ['PROBIOTICS'], 'SESSION': [2], 'CONDITION': ['SHAM', 'VMPFC']}, #tms_postGut data, should reveal if cTBS successfully killed the GBA effect or not
+}
+
+
+# Data loading
+def _stage(config, name, key=None, data=None):
+    # Measured stage when config holds an instrumentation.Recorder under 'recorder', a no-op otherwise
+    recorder = (config or {}).get('recorder')
+    return recorder.stage(name, key, data) if recorder is not None else contextlib.nullcontext({})
+
+
+def _selected_files(data_files, dataset_names=None):
+    return {name: filename for name, filename in data_files.items()
+            if dataset_names is None or name in dataset_names}
+
 
-for data_name in data_files:
-    data_filename = filedialog.askopenfilename(title='Select Data Files')
-    base_filename = os.path.basename(data_filename)
+def read_data_file(data_filename, config=None, reports=None):
+    """Read one data file, skipping the columns in columns_to_remove and applying data_types while parsing.
 
-    if base_filename in reverse_data_files:
-        dataset_name = reverse_data_files[base_filename]
-        data = hddm.load_csv(data_filename, dtype=data_types)
-        datasets[dataset_name] = data
+    If reports is a dict, the reader's report (columns skipped, bytes saved) is stored under data_filename.
+    """
+    config = config or {}
+    data, report = read_csv_projected(data_filename,
+                                      columns_to_remove=config.get('columns_to_remove', columns_to_remove),
+                                      dtype=config.get('data_types', data_types),
+                                      downcast=config.get('downcast_columns', downcast_columns))
+    if reports is not None:
+        reports[data_filename] = report
+    return data
+
+
+def _read_measured(data_filename, dataset_name, config, reports):
+    with _stage(config, 'read_data_file', dataset_name) as record:
+        data = read_data_file(data_filename, config, reports)
+        record['rows_out'] = len(data)
+    return data
+
+
+def load_datasets(directory, data_files, config=None, dataset_names=None, reports=None, max_workers=None):
+    """Load the files in data_files (dataset name -> filename) from directory.
+
+    If dataset_names is given, only those datasets are read from disk. Several files are read
+    concurrently on a thread pool of max_workers threads (one at a time when config holds a recorder,
+    so every file is measured on its own).
+    """
+    config = config or {}
+    selected_files = _selected_files(data_files, dataset_names)
+    if config.get('recorder') is not None:
+        max_workers = 1
+
+    names = list(selected_files)
+    file_paths = [os.path.join(directory, selected_files[name]) for name in names]
+    if len(names) > 1 and max_workers != 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            frames = list(executor.map(_read_measured, file_paths, names, [config] * len(names),
+                                       [reports] * len(names)))
     else:
-        print(f"File '{base_filename}' does not match any dataset name in the mapping.")
+        frames = [_read_measured(file_path, name, config, reports) for file_path, name in zip(file_paths, names)]
+    return dict(zip(names, frames))
+
+
+# Cleaned-data cache
+def file_hash(file_path, block_size=1 << 20):
+    """Return the sha256 hex digest of a file's content, read in blocks."""
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def cache_key(data_filename, config=None):
+    """Key for the cleaned version of data_filename: the file content plus every setting that changes the result."""
+    config = config or {}
+    settings = {
+        'data_types': config.get('data_types', data_types),
+        'exclusions': config.get('exclusions', exclusions),
+        'columns_to_remove': config.get('columns_to_remove', columns_to_remove),
+        'column_replacements': config.get('column_replacements', column_replacements),
+        'downcast_columns': config.get('downcast_columns', downcast_columns),
+    }
+    sha = hashlib.sha256(file_hash(data_filename).encode())
+    sha.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    return sha.hexdigest()[:16]
+
+
+def _load_clean_file(data_filename, config):
+    data = read_data_file(data_filename, config, config.get('read_reports'))
+    return clean_datasets({'data': data}, config)['data']
+
+
+def load_cached_dataset(data_filename, cache_dir, config=None, columns=None):
+    """Load the cleaned dataset for data_filename from a Feather cache, building the cache on a miss.
+
+    The cache file is named after the source file, a hash of its absolute path and cache_key, so editing
+    the source file or any of the filter lists makes a new entry (older entries for the same file are
+    removed), and files with the same name in different folders keep entries of their own. Cache hits are
+    memory-mapped and only the requested columns are read. Without pyarrow the file is loaded and cleaned
+    without caching.
+    """
+    try:
+        from pyarrow import feather
+    except ImportError:
+        feather = None
+
+    config = config or {}
+    if feather is None:
+        data = _load_clean_file(data_filename, config)
+        return data if columns is None else data[columns]
+
+    base_filename = os.path.splitext(os.path.basename(data_filename))[0]
+    source_id = hashlib.sha256(os.path.abspath(data_filename).encode()).hexdigest()[:12]
+    cache_prefix = f"{base_filename}-{source_id}"
+    cache_path = os.path.join(cache_dir, f"{cache_prefix}-{cache_key(data_filename, config)}.feather")
+
+    if not os.path.exists(cache_path):
+        data = _load_clean_file(data_filename, config)
+        os.makedirs(cache_dir, exist_ok=True)
+        for stale_path in glob.glob(os.path.join(cache_dir, f"{glob.escape(cache_prefix)}-*.feather")):
+            os.remove(stale_path)
+        tmp_path = cache_path + '.tmp'
+        feather.write_feather(data, tmp_path)
+        os.replace(tmp_path, cache_path)
+
+    table = feather.read_table(cache_path, columns=columns, memory_map=True)
+    return table.to_pandas()
+
+
+def select_data_files(data_files):
+    """Prompt for the data folder and files through Tk dialogs, as the script used to do on import.
+
+    Returns the selected directory and a mapping of dataset name -> file path.
+    """
+    import tkinter as tk
+    from tkinter import filedialog
+
+    root = tk.Tk()
+    root.wm_attributes("-topmost", 1)  # Set the window to be always on top
+    root.withdraw()  # Hide the root window
+
+    # Prompt user to select a folder
+    directory = filedialog.askdirectory(title='Select Data Folder')
+
+    reverse_data_files = {filename: name for name, filename in data_files.items()}
+    selected_files = {}
+    for data_name in data_files:
+        data_filename = filedialog.askopenfilename(title='Select Data Files')
+        base_filename = os.path.basename(data_filename)
+
+        if base_filename in reverse_data_files:
+            selected_files[reverse_data_files[base_filename]] = data_filename
+        else:
+            print(f"File '{base_filename}' does not match any dataset name in the mapping.")
+
+    root.destroy()
+    return directory, selected_files
+
 
 # Data cleaning and pre-processing
 def filter_data(column_name, values, dataframes):
     for key, df in dataframes.items():
         mask = df[column_name].isin(values)
         dataframes[key] = df.loc[~mask].copy()
-        
+
 def remove_columns(columns_to_remove, dataframes):
     """Remove specified columns from given dataframes."""
     for key, df in dataframes.items():
@@ -80,46 +259,221 @@ def remove_columns(columns_to_remove, dataframes):
                 df.drop(col, axis=1, inplace=True)
         dataframes[key] = df
 
-filter_data('CONCLUDED', ['DROPOUT'], datasets) #remove all subjects registered as dropouts
-filter_data('PARTICIPANT', ['PT0015', 'PT0034', 'PT0053', 'PT0057', 'PT0060', 'PT0062'], datasets) # these subjects removed because of either not fully completing placebo/probiotic protcol or substantial data recording issues
 
-columns_to_remove = ['REP','SESSIONCOMPLETE','NrOfPink','TokenLoc','BettingValuePink',
-                     'BettingValueBlue','TRIALCODE','TrialOnset','ResponseTime',
-                     'ValidTrial','ProbPink','ProbBlue','TRIAL HANDLE','EVPINK',
-                     'EVBLUE','EVDIFF','EV.PICKED','VARPINK','VARBLUE','VARDIFF',
-                     'VARPICKED'] #not needed, saves filespace
-remove_columns(columns_to_remove, datasets)
+def rename_columns(column_replacements, dataframes):
+    """Drop incomplete rows and rename columns (substring replacement, as before) in given dataframes."""
+    for key, df in dataframes.items():
+        df.dropna(inplace=True)
+        for old_col, new_col in column_replacements.items():
+            df.columns = [col.replace(old_col, new_col) for col in df.columns]
+        dataframes[key] = df
 
 
-column_replacements = {
-    'PARTICIPANT': 'subj_idx',
-    'NetRT': 'rt',
-    'HEVC': 'response'
-}
+def clean_datasets(datasets, config=None):
+    """Apply the exclusions, column removal and column renames to datasets in place.
+
+    Datasets are cleaned one at a time, so each step can be measured per dataset (see run_pipeline's 'recorder').
+    """
+    config = config or {}
+    for key in datasets:
+        dataset = {key: datasets[key]}
+        for column_name, values in config.get('exclusions', exclusions):
+            with _stage(config, f'filter_data({column_name})', key, dataset):
+                filter_data(column_name, values, dataset)
+        with _stage(config, 'remove_columns', key, dataset):
+            remove_columns(config.get('columns_to_remove', columns_to_remove), dataset)
+        with _stage(config, 'rename_columns', key, dataset):
+            rename_columns(config.get('column_replacements', column_replacements), dataset)
+        datasets[key] = dataset[key]
+    return datasets
+
+
+# Dataset views
+class DatasetViews(MutableMapping):
+    """Named subsets of one master dataset, defined by predicates and taken from the master only when used.
+
+    views maps a name to {column: values to keep}; a row belongs to a view when it matches every column.
+    Values are compared as stripped, upper-case strings, so 'Sham', 'SHAM' and ' sham' (and 1 and '1')
+    are the same. Every column is factorized once, so a view costs one pass over integer codes; the view's
+    frame is selected from the master the first time it is used and kept. Loaded datasets (including the
+    master) are in the mapping as well, and assigning a name stores a frame, as with a dict.
+    """
+    def __init__(self, master, views, datasets=None):
+        self.master = master
+        self.views = dict(views)
+        self.datasets = dict(datasets or {})
+        self._codes = {}
+
+    def normalized_codes(self, column):
+        # Integer codes of the column and its normalized labels, computed once per column
+        if column not in self._codes:
+            codes, uniques = pd.factorize(self.master[column])
+            labels = pd.Index(uniques).astype(str).str.strip().str.upper()
+            self._codes[column] = (codes, labels)
+        return self._codes[column]
+
+    def rows(self, name):
+        """Positions of the master rows in view name."""
+        keep = np.ones(len(self.master), dtype=bool)
+        for column, values in self.views[name].items():
+            codes, labels = self.normalized_codes(column)
+            wanted = labels.isin([str(value).strip().upper() for value in values])
+            # Missing values have code -1 and hit the extra False at the end
+            keep &= np.append(wanted, False)[codes]
+        return np.flatnonzero(keep)
 
-for key, df in datasets.items():
-    df.dropna(inplace=True)
+    def __getitem__(self, name):
+        if name not in self.datasets:
+            if name not in self.views:
+                raise KeyError(name)
+            self.datasets[name] = self.master.iloc[self.rows(name)]
+        return self.datasets[name]
+
+    def __setitem__(self, name, dataframe):
+        self.datasets[name] = dataframe
+
+    def __delitem__(self, name):
+        if name not in self.datasets and name not in self.views:
+            raise KeyError(name)
+        self.datasets.pop(name, None)
+        self.views.pop(name, None)
+
+    def __iter__(self):
+        return iter(dict.fromkeys(list(self.datasets) + list(self.views)))
+
+    def __len__(self):
+        return len(set(self.datasets) | set(self.views))
+
+
+def run_pipeline(config):
+    """Load and clean the datasets described by config and return them as a dict of dataframes.
+
+    config is a dict with the keys:
+        'directory'           folder containing the data files (required)
+        'data_files'          dataset name -> filename mapping (default: data_files)
+        'datasets'            optional list of dataset names to load; others are not read
+        'data_types'          dtype mapping applied while parsing (default: data_types)
+        'downcast_columns'    numeric columns to downcast after parsing (default: downcast_columns)
+        'exclusions'          list of (column, values) rows to drop (default: exclusions)
+        'columns_to_remove'   columns to drop (default: columns_to_remove)
+        'column_replacements' column renames (default: column_replacements)
+        'cache_dir'           optional folder for the cleaned-data cache (see load_cached_dataset)
+        'columns'             optional list of (renamed) columns to read from the cache
+        'read_reports'        optional dict that receives the CSV reader's report per file read
+        'recorder'            optional instrumentation.Recorder that measures every stage per dataset
+        'views'               optional name -> predicates mapping (e.g. dataset_views) of subsets of the master
+        'master'              dataset the views are taken from (default: 'Raw Data Set')
+        'max_workers'         threads for reading several data files at once
+
+    With 'views', the master file is parsed and cleaned once and a DatasetViews mapping is returned,
+    holding the loaded datasets and the views.
+    """
+    directory = config['directory']
+    dataset_names = config.get('datasets')
+    views = _selected_files(config.get('views') or {}, dataset_names)
+    master = config.get('master', 'Raw Data Set')
+    if views and dataset_names is not None:
+        dataset_names = list(dataset_names) + [master]
+    selected_files = _selected_files(config.get('data_files', data_files), dataset_names)
+
+    if config.get('cache_dir'):
+        datasets = {}
+        for name, filename in selected_files.items():
+            with _stage(config, 'load_cached_dataset', name) as record:
+                datasets[name] = load_cached_dataset(os.path.join(directory, filename), config['cache_dir'],
+                                                     config, columns=config.get('columns'))
+                record['rows_out'] = len(datasets[name])
+    else:
+        datasets = load_datasets(directory, selected_files, config, reports=config.get('read_reports'),
+                                 max_workers=config.get('max_workers'))
+        datasets = clean_datasets(datasets, config)
+
+    if views:
+        return DatasetViews(datasets[master], views, datasets)
+    return datasets
+
+
+# Streaming preprocessing
+def _renamed(column, column_replacements):
     for old_col, new_col in column_replacements.items():
-        df.columns = [col.replace(old_col, new_col) for col in df.columns]
-    datasets[key] = df
+        column = column.replace(old_col, new_col)
+    return column
+
+
+def clean_chunk(chunk, config=None):
+    """Apply the exclusions, renames, incomplete-row removal and RT floor to one chunk of an (already projected) file.
+
+    Rows are dropped with a single combined mask, so no intermediate copies are made.
+    """
+    config = config or {}
+    mask = pd.Series(False, index=chunk.index)
+    for column_name, values in config.get('exclusions', exclusions):
+        mask |= chunk[column_name].isin(values)
+    mask |= chunk.isna().any(axis=1)
+
+    replacements = config.get('column_replacements', column_replacements)
+    chunk.columns = [_renamed(col, replacements) for col in chunk.columns]
+
+    rt_column = config.get('rt_column', 'rt')
+    if rt_column in chunk.columns:
+        mask |= ~(chunk[rt_column] > config.get('rt_floor', 0.1)) #filter out trials 100ms and below
+    return chunk.loc[~mask]
+
+
+def stream_pipeline(data_filename, output_path, config=None, chunksize=100000):
+    """Clean a CSV export that may not fit in memory, writing the result incrementally to output_path.
+
+    The file is read chunksize rows at a time; only the columns that survive columns_to_remove are parsed,
+    and each chunk is cleaned with clean_chunk (exclusions, renames, RT floor) and appended to output_path.
+    Output is Parquet when output_path ends in '.parquet' (requires pyarrow), CSV otherwise. Peak memory is
+    bounded by the chunk size. z-score outlier removal needs the whole dataset and is not applied here.
+
+    Returns a dict with the number of chunks, rows read and rows written.
+    """
+    config = config or {}
+    header = pd.read_csv(data_filename, nrows=0).columns
+    usecols = projected_columns(header, columns_to_remove=config.get('columns_to_remove', columns_to_remove))
+    dtype = {col: col_type for col, col_type in config.get('data_types', data_types).items() if col in usecols}
+    replacements = config.get('column_replacements', column_replacements)
+    to_downcast = [_renamed(col, replacements) for col in config.get('downcast_columns', downcast_columns)]
+
+    parquet = str(output_path).endswith('.parquet')
+    if parquet:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
 
+    summary = {'chunks': 0, 'rows_in': 0, 'rows_out': 0}
+    writer = None
+    try:
+        for chunk in pd.read_csv(data_filename, usecols=usecols, dtype=dtype, chunksize=chunksize):
+            summary['chunks'] += 1
+            summary['rows_in'] += len(chunk)
+            chunk = clean_chunk(chunk, config)
+            summary['rows_out'] += len(chunk)
 
+            if parquet:
+                # The Parquet schema is fixed by the first chunk, so downcast columns always become float32
+                # (a chunk-dependent int8/float32 choice could not be appended) and categories, which differ
+                # between chunks, are written as plain strings
+                for col in to_downcast:
+                    if col in chunk.columns:
+                        chunk[col] = pd.to_numeric(chunk[col], downcast='float')
+                for col in chunk.select_dtypes(include='category').columns:
+                    chunk[col] = chunk[col].astype(str)
+                table = pa.Table.from_pandas(chunk, preserve_index=True)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+            else:
+                downcast_frame_columns(chunk, to_downcast)
+                chunk.to_csv(output_path, mode='w' if summary['chunks'] == 1 else 'a',
+                             header=summary['chunks'] == 1)
+    finally:
+        if writer is not None:
+            writer.close()
 
-# Variable assignments (if required)
+    return summary
 
-raw_dataset = datasets['Raw Data Set']
-# avg_dataset = datasets['Average Data Set']
-# session1_data = datasets['Session 1 Data']
-# session2_data = datasets['Session 2 Data']
-# baseline_sham = datasets['Baseline_SHAM']
-# baseline_spl = datasets['Baseline_SPL']
-# baseline_vmpfc = datasets['Baseline_VMPFC']
-# gut_sham_ws = datasets['Gut_SHAM_WS']
-# gut_sham_bs = datasets['Gut_SHAM_BS']
-# gut_spl_bs = datasets['Gut_SPL_BS']
-# gut_spl_ws = datasets['Gut_SPL_WS']
-# tms_pregut = datasets['TMS_preGut']
-# tms_postgut = datasets['TMS_postGut']
 
 # Data check
 def print_data_info(data_name, dataframe):
@@ -128,18 +482,39 @@ def print_data_info(data_name, dataframe):
     print(dataframe.tail(5))
 
 
-print_data_info('Raw Data Set', raw_dataset)
-# print_data_info('Average Data Set', avg_dataset)
-# print_data_info('Session 1 Data',session1_data)
-# print_data_info('Session 2 Data', session2_data)
-# print_data_info('Both Groups S1 - SHAM', baseline_sham)
-# print_data_info('Both Groups S1 - SPL', baseline_spl)
-# print_data_info('Both Groups S1 - VMPFC', baseline_vmpfc)
-# print_data_info('Probiotic S1S2 - SHAM', gut_sham_ws)
-# print_data_info('Both Groups S2 - SHAM', gut_sham_bs)
-# print_data_info('Probiotic S1S2 - SPL', gut_spl_bs)
-# print_data_info('Both Groups S2 - SPL', gut_spl_ws)
-# print_data_info('Both Groups S1 - SHAM v VMPFC', tms_pregut)
-# print_data_info('Probiotic S2 - SHAM v VMPFC', tms_postgut)
+if __name__ == '__main__':
+    directory, selected_files = select_data_files(data_files)
+    datasets = run_pipeline({
+        'directory': directory,
+        'data_files': selected_files,
+        'views': dataset_views,
+    })
 
+    # Variable assignments (if required)
+    raw_dataset = datasets['Raw Data Set']
+    # avg_dataset = datasets['Average Data Set']
+    # session1_data = datasets['Session 1 Data']
+    # session2_data = datasets['Session 2 Data']
+    # baseline_sham = datasets['Baseline_SHAM']
+    # baseline_spl = datasets['Baseline_SPL']
+    # baseline_vmpfc = datasets['Baseline_VMPFC']
+    # gut_sham_ws = datasets['Gut_SHAM_WS']
+    # gut_sham_bs = datasets['Gut_SHAM_BS']
+    # gut_spl_bs = datasets['Gut_SPL_BS']
+    # gut_spl_ws = datasets['Gut_SPL_WS']
+    # tms_pregut = datasets['TMS_preGut']
+    # tms_postgut = datasets['TMS_postGut']
 
+    print_data_info('Raw Data Set', raw_dataset)
+    # print_data_info('Average Data Set', avg_dataset)
+    # print_data_info('Session 1 Data',session1_data)
+    # print_data_info('Session 2 Data', session2_data)
+    # print_data_info('Both Groups S1 - SHAM', baseline_sham)
+    # print_data_info('Both Groups S1 - SPL', baseline_spl)
+    # print_data_info('Both Groups S1 - VMPFC', baseline_vmpfc)
+    # print_data_info('Probiotic S1S2 - SHAM', gut_sham_ws)
+    # print_data_info('Both Groups S2 - SHAM', gut_sham_bs)
+    # print_data_info('Probiotic S1S2 - SPL', gut_spl_bs)
+    # print_data_info('Both Groups S2 - SPL', gut_spl_ws)
+    # print_data_info('Both Groups S1 - SHAM v VMPFC', tms_pregut)
+    # print_data_info('Probiotic S2 - SHAM v VMPFC', tms_postgut)
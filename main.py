@@ -2,9 +2,12 @@
 
 """
 Main script for pre-processing. Calls upon load_data and functions modules.
-This script automates the process of selecting a working directory, importing data, 
-processing it (including outlier removal and missing value handling), and then visualizing 
+This script automates the process of selecting a working directory, importing data,
+processing it (including outlier removal and missing value handling), and then visualizing
 the results. It also allows for exporting the processed data to CSV files.
+
+The preprocessing itself lives in preprocess(config), which takes explicit paths and can be
+imported and called from batch jobs without any dialogs.
 """
 
 #############
@@ -12,12 +15,15 @@ the results. It also allows for exporting the processed data to CSV files.
 #############
 
 # Import required libraries and modules
+import json
 import os
-import tkinter as tk
-from tkinter import filedialog
+
 
 # Set up a Tkinter root window to prompt the user to select a working directory
 def select_working_directory():
+    import tkinter as tk
+    from tkinter import filedialog
+
     root = tk.Tk()
     root.wm_attributes("-topmost", 1)  # Set the window to be always on top
     root.withdraw()  # Hide the root window
@@ -25,59 +31,107 @@ def select_working_directory():
     cwd = filedialog.askdirectory(title='Select Working Directory')
     os.chdir(cwd)
 
-select_working_directory()
 
-# Import custom functions and data loading modules
-import subdirectory.functions as fn
-import subdirectory.load_data as load
+def preprocess(config, return_counts=False):
+    """Load, clean and outlier-correct the datasets described by config (see load_data.run_pipeline).
+
+    If config holds an instrumentation.Recorder under 'recorder', the loading, cleaning and outlier
+    removal stages are measured with it.
+
+    Returns the cleaned datasets and the outlier-corrected datasets, and with return_counts=True also
+    the number of outliers removed per dataset (see functions.remove_z_outliers).
+    """
+    # Import custom functions and data loading modules (from the folder of this script, like the other modules)
+    import functions as fn
+    import load_data as load
+
+    # Uncomment the following lines if you need to reload the modules after making changes
+    # import importlib
+    # importlib.reload(fn)
+    # importlib.reload(load)
+
+    datasets = load.run_pipeline(config)
+
+    # Process the data: Remove outliers and handle missing values
+    remove_z_outliers = fn.remove_z_outliers
+    if config.get('recorder') is not None:
+        remove_z_outliers = config['recorder'].wrap('remove_z_outliers', remove_z_outliers)
+    corr_datasets, removed_counts = remove_z_outliers(datasets, return_counts=True)
+    if return_counts:
+        return datasets, corr_datasets, removed_counts
+    return datasets, corr_datasets
+
+
+def main(report_path='preprocessing_report.json', profile=False, qc_report_path='qc_report.json', trace_memory=False):
+    """Run the interactive preprocessing and write a timing/memory report of every stage to report_path
+    (in the working directory); with profile=True the cProfile statistics are saved next to it, and with
+    trace_memory=True the Python allocation peaks (slower, see instrumentation.Recorder). The
+    quality-control statistics of the datasets are saved to qc_report_path."""
+    select_working_directory()
+
+    import functions as fn
+    import instrumentation
+    import load_data as load
+    import trial_store
+
+    recorder = instrumentation.Recorder(trace_memory=trace_memory, profile=profile)
 
-# Uncomment the following lines if you need to reload the modules after making changes
-# import importlib
-# importlib.reload(fn)
-# importlib.reload(load)
+    # Load and preprocess the data
+    directory, selected_files = load.select_data_files(load.data_files)
+    datasets, corr_datasets, removed_counts = preprocess({
+        'directory': directory,
+        'data_files': selected_files,
+        'recorder': recorder,
+    }, return_counts=True)
 
-# Load and preprocess the data
-dictionary = load.data_files
-datasets = load.datasets
+    # Filter out the 'SHAM' condition data
+    raw_data = datasets["Raw Data Set"]
+    raw_grouped = raw_data.groupby('CONDITION')
 
-# Process the data: Remove outliers and handle missing values
-corr_datasets = fn.remove_z_outliers(datasets)
+    sham_data = raw_grouped.get_group('SHAM')
 
-# Filter out the 'SHAM' condition data
-raw_data = datasets["Raw Data Set"]
-raw_grouped = raw_data.groupby('CONDITION')
+    rawc = corr_datasets["Raw Data Set"]
+    rawc_grouped = rawc.groupby('CONDITION')
 
-sham_data = raw_grouped.get_group('SHAM')
+    shamc_data = rawc_grouped.get_group('SHAM')
 
-rawc = corr_datasets["Raw Data Set"]
-rawc_grouped = rawc.groupby('CONDITION')
+    # Check missing values, lengths, response counts and RTs (the outlier counts come from preprocess)
+    qc = {
+        'datasets': recorder.wrap('qc_report', fn.qc_report)(datasets),
+        'corrected': recorder.wrap('qc_report', fn.qc_report)(corr_datasets, removed_counts),
+    }
+    fn.print_qc_report(qc['datasets'])
+    fn.print_qc_report(qc['corrected'])
+    with open(qc_report_path, 'w') as f:
+        json.dump(qc, f, indent=1)
 
-shamc_data = rawc_grouped.get_group('SHAM')
+    # Perform data visualization
+    recorder.wrap('plot_group_rt', fn.plot_group_rt)(datasets, corr_datasets)
+    recorder.wrap('plot_subject_rt', fn.plot_subject_rt)(datasets, corr_datasets)
+    recorder.wrap('plot_boxplots', fn.plot_boxplots)(datasets, corr_datasets)
+    recorder.wrap('plot_violinplots', fn.plot_violinplots)(datasets, corr_datasets)
 
-# Re-check and handle outliers and missing values
-corr_datasets = fn.remove_z_outliers(datasets)
-fn.check_missing_values(datasets)
-fn.check_missing_values(corr_datasets)
-fn.print_column_length(datasets, 'rt')
-fn.print_column_length(corr_datasets, 'rt')
-fn.count_response_values(corr_datasets)
+    # Use corrected dataframes and also save as .csv to file
+    raw_corrected = corr_datasets['Raw Data Set']
+    raw_corrected.to_csv('raw_corrected.csv')
+    # Compact copy for the later scripts (DatasetHandler, empsim_compiler), see trial_store.py
+    trial_store.write_trial_store(raw_corrected, 'raw_corrected_store')
 
-# Perform data visualization
-fn.plot_group_rt(datasets, corr_datasets)
-fn.plot_subject_rt(datasets, corr_datasets)
-fn.plot_boxplots(datasets, corr_datasets)
-fn.plot_violinplots(datasets, corr_datasets)
+    # Uncomment the following lines to save additional corrected datasets as CSV
+    # avg_corrected = corr_datasets['Average Data Set']
+    # avg_corrected.to_csv('avg_corrected.csv')
 
-# Use corrected dataframes in global namespace and also save as .csv to file
-raw_corrected = corr_datasets['Raw Data Set']
-raw_corrected.to_csv('raw_corrected.csv')
+    # session1_corrected = corr_datasets['Session 1 Data']
+    # session1_corrected.to_csv('session1_corrected_raw.csv')
 
-# Uncomment the following lines to save additional corrected datasets as CSV
-# avg_corrected = corr_datasets['Average Data Set']
-# avg_corrected.to_csv('avg_corrected.csv')
+    # session2_corrected = corr_datasets['Session 2 Data']
+    # session2_corrected.to_csv('session2_corrected_raw.csv')
 
-# session1_corrected = corr_datasets['Session 1 Data']
-# session1_corrected.to_csv('session1_corrected_raw.csv')
+    recorder.save_report(report_path)
+    recorder.print_summary()
 
-# session2_corrected = corr_datasets['Session 2 Data']
-# session2_corrected.to_csv('session2_corrected_raw.csv')
+    return datasets, corr_datasets
+
+
+if __name__ == '__main__':
+    main()
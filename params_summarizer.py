@@ -0,0 +1,81 @@
+"""
+This script collects the fast-dm parameter estimates (parameters_*.txt) of every participant into one table,
+replacing params_summarizer.R and metasummarizer.R.
+Group, session and condition are taken from the folder layout written by
+DatasetHandler.split_by_group_session_condition_and_save (group/session N/condition/), files are parsed on a
+thread pool with one compiled regular expression each, and the result is written as params_for_simulation.txt.
+"""
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from empsim_compiler import normalize_group
+
+param_names = ['a', 'v', 't0', 'st0']
+id_columns = ['group', 'session', 'condition', 'subject']
+
+# e.g. "a = 1.234567"; the first line for each parameter is used, as in the R script
+param_pattern = re.compile(r'^\s*(a|v|t0|st0)\s*=\s*([-+0-9.eE]+)', re.MULTILINE)
+
+
+def parse_parameters_text(text):
+    params = {}
+    for name, value in param_pattern.findall(text):
+        params.setdefault(name, float(value))
+    return {name: params.get(name, float('nan')) for name in param_names}
+
+
+def parse_parameters_file(file_path, base_dir):
+    """Parse one parameters_*.txt file into a row: group, session, condition, subject, a, v, t0, st0.
+
+    Group, session and condition come from the file's folders below base_dir ('session 1' becomes 's1',
+    as in the simulation file names, and the group is normalized as in empsim_compiler, e.g. 'probiotics'
+    becomes 'probiotic'); levels that are missing are left empty.
+    """
+    with open(file_path) as f:
+        params = parse_parameters_text(f.read())
+
+    folders = list(Path(file_path).relative_to(base_dir).parent.parts) + [None, None, None]
+    group, session, condition = folders[:3]
+    if group is not None:
+        group = normalize_group(group)
+    if session is not None:
+        session = 's' + session.replace('session', '').strip()
+
+    row = {
+        'group': group,
+        'session': session,
+        'condition': condition,
+        'subject': Path(file_path).stem.replace('parameters_', ''),
+    }
+    row.update(params)
+    return row
+
+
+def summarize_parameters(base_dir, max_workers=None):
+    """Parse every parameters_*.txt file below base_dir and return one typed parameter table."""
+    files = sorted(Path(base_dir).rglob('parameters_*.txt'))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        rows = list(executor.map(parse_parameters_file, files, [base_dir] * len(files)))
+
+    summary = pd.DataFrame(rows, columns=id_columns + param_names)
+    return summary.astype({name: 'float64' for name in param_names})
+
+
+def save_summary(summary, output_path):
+    # Tab-separated, as read by simulate_mvrnorm.R and simulate_ddm.load_params
+    summary.to_csv(output_path, sep='\t', index=False)
+
+
+if __name__ == '__main__':
+    # Set the parent folder of the group/session/condition folders (the split 'datasets' folder)
+    base_dir = r"C:\Users\Darren\Desktop\CODE\FASTDM\datasets_GSCsplit"
+    output_path = os.path.join(base_dir, "params_for_simulation.txt")
+
+    summary = summarize_parameters(base_dir)
+    save_summary(summary, output_path)
+    print(f"Summarized {len(summary)} parameter files into {output_path}")
@@ -0,0 +1,258 @@
+"""
+This script runs the preprocessing-to-compiler chain as stages with declared inputs, outputs and parameters,
+and reruns only what changed.
+
+Each stage's fingerprint covers the content of its inputs and its parameters (outlier threshold, exclusion list,
+columns, ...). A stage is skipped when its fingerprint matches the last successful run and its outputs exist.
+The participant split is also incremental within the stage: only participant files whose rows changed are
+rewritten (see DatasetHandler.split_by_group_session_condition_and_save), and the simulation stage only reruns
+rows whose parameters changed. Fast-dm itself runs outside this script, between the split and summarize stages.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+class Stage:
+    """One pipeline step. run(stage, previous) does the work; previous is the state the stage returned last time.
+
+    run may return a dict of extra state (e.g. per-partition fingerprints) to keep for the next run.
+    """
+    def __init__(self, name, run, inputs=(), outputs=(), params=None):
+        self.name = name
+        self.run = run
+        self.inputs = [str(path) for path in inputs]
+        self.outputs = [str(path) for path in outputs]
+        self.params = params or {}
+
+
+class Pipeline:
+    def __init__(self, stages, state_path='.pipeline_state.json'):
+        self.stages = stages
+        self.state_path = state_path
+        self.state = self.load_state()
+
+    def load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                return json.load(f)
+        return {'files': {}, 'stages': {}}
+
+    def save_state(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def file_fingerprint(self, file_path):
+        # Content hash, reused while the file's size and modification time are unchanged
+        stat = os.stat(file_path)
+        key = os.path.abspath(file_path)
+        cached = self.state['files'].get(key)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha256']
+
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        self.state['files'][key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha.hexdigest()}
+        return sha.hexdigest()
+
+    def path_fingerprint(self, path):
+        """Fingerprint of a file, or of every file below a directory (names and contents)."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        if path.is_file():
+            return self.file_fingerprint(path)
+        sha = hashlib.sha256()
+        for file_path in sorted(p for p in path.rglob('*') if p.is_file()):
+            sha.update(file_path.relative_to(path).as_posix().encode())
+            sha.update(self.file_fingerprint(file_path).encode())
+        return sha.hexdigest()
+
+    def stage_fingerprint(self, stage):
+        sha = hashlib.sha256(stage.name.encode())
+        sha.update(json.dumps(stage.params, sort_keys=True, default=str).encode())
+        for input_path in stage.inputs:
+            sha.update(json.dumps([input_path, self.path_fingerprint(input_path)]).encode())
+        return sha.hexdigest()
+
+    def is_stale(self, stage):
+        previous = self.state['stages'].get(stage.name)
+        if previous is None or previous['fingerprint'] != self.stage_fingerprint(stage):
+            return True
+        return not all(os.path.exists(output_path) for output_path in stage.outputs)
+
+    def run(self, stage_names=None, force=False):
+        """Run the stale stages (all of stage_names, if force) in order and return stage name -> 'ran'/'skipped'.
+
+        Fingerprints are taken before a stage runs, and the state is saved after every stage, so an
+        interrupted run resumes at the stage that failed.
+        """
+        status = {}
+        for stage in self.stages:
+            if stage_names is not None and stage.name not in stage_names:
+                continue
+            if not force and not self.is_stale(stage):
+                status[stage.name] = 'skipped'
+                print(f"Stage '{stage.name}' is up to date.")
+                continue
+
+            fingerprint = self.stage_fingerprint(stage)
+            previous = self.state['stages'].get(stage.name, {}).get('extra', {})
+            print(f"Running stage '{stage.name}'...")
+            extra = stage.run(stage, previous) or {}
+            self.state['stages'][stage.name] = {'fingerprint': fingerprint, 'extra': extra}
+            self.save_state()
+            status[stage.name] = 'ran'
+        return status
+
+
+# Stages of the thesis analysis
+def run_preprocess(stage, previous):
+    import functions as fn
+    import load_data as load
+
+    raw_file = stage.inputs[0]
+    datasets = load.run_pipeline({
+        'directory': os.path.dirname(raw_file),
+        'data_files': {'Raw Data Set': os.path.basename(raw_file)},
+        'data_types': stage.params['data_types'],
+        'exclusions': stage.params['exclusions'],
+        'columns_to_remove': stage.params['columns_to_remove'],
+        'column_replacements': stage.params['column_replacements'],
+        'downcast_columns': stage.params['downcast_columns'],
+    })
+    corr_datasets = fn.remove_z_outliers(datasets, threshold=stage.params['threshold'])
+    corr_datasets['Raw Data Set'].to_csv(stage.outputs[0])
+
+
+def run_split(stage, previous):
+    from datahandler_GSCsplit import DatasetHandler
+
+    handler = DatasetHandler(stage.inputs[0], stage.params['columns_to_keep'])
+    handler.load_csv_dataset()
+    handler.filter_columns()
+    handler.replace_spaces_in_clusters()
+    handler.split_by_group_session_condition_and_save('subj_idx', 'GROUP', 'SESSION', 'CONDITION', stage.outputs[0],
+                                                       previous_fingerprints=previous.get('partitions'), fingerprints=True)
+    return {'partitions': handler.partition_fingerprints}
+
+
+def run_summarize(stage, previous):
+    import params_summarizer
+
+    summary = params_summarizer.summarize_parameters(stage.inputs[0])
+    if summary.empty:
+        # Stop here instead of passing an empty table on to the simulation
+        raise FileNotFoundError(f"No parameters_*.txt files below {stage.inputs[0]}; run fast-dm on the split "
+                                f"files and put its output there (config 'parameters_dir') before this stage.")
+    params_summarizer.save_summary(summary, stage.outputs[0])
+
+
+def run_simulate(stage, previous):
+    import simulate_ddm
+
+    params_data = simulate_ddm.load_params(stage.inputs[0])
+    output_dir = stage.outputs[0]
+    # Every row's parameter draw uses the covariance of all rows, so it is part of every row's fingerprint
+    cov_matrix = simulate_ddm.calculate_cov_matrix(params_data).tolist()
+
+    # Rows are files of their own: drop the files of rows whose parameters changed, the driver redoes them
+    row_fingerprints = {}
+    for row in params_data.to_dict('records'):
+        file_name = simulate_ddm.simulation_filename(row)
+        row_fingerprints[file_name] = hashlib.sha256(
+            json.dumps([row, cov_matrix, stage.params], sort_keys=True, default=str).encode()).hexdigest()
+        file_path = os.path.join(output_dir, file_name)
+        if previous.get('rows', {}).get(file_name) != row_fingerprints[file_name] and os.path.exists(file_path):
+            os.remove(file_path)
+
+    summary = simulate_ddm.run_simulation_driver(params_data, stage.params['root_seed'], output_dir,
+                                                 n_trials=stage.params['n_trials'], n_replicates=stage.params['n_replicates'])
+    if summary['failed']:
+        raise RuntimeError(f"{len(summary['failed'])} simulation rows failed; rerun to resume.")
+
+    # Drop the files of rows that are no longer in the parameter table, so compile does not pick them up
+    for file_path in Path(output_dir).glob('*_sim.dat'):
+        if file_path.name not in row_fingerprints:
+            file_path.unlink()
+    return {'rows': row_fingerprints}
+
+
+def run_compile(stage, previous):
+    import empsim_compiler
+
+    empirical_folders = stage.params['empirical_folders']
+    if empirical_folders is None:
+        # Every group/session/condition folder of the split
+        empirical_folders = sorted(str(path) for path in Path(stage.inputs[0]).glob('*/*/*') if path.is_dir())
+    empirical_data = empsim_compiler.process_empirical_data(empirical_folders)
+    simulated_data = empsim_compiler.process_simulated_data(
+        stage.inputs[-1], sample_size=empsim_compiler.empirical_sample_sizes(empirical_data))
+    empsim_compiler.save_data_to_csv(empsim_compiler.reorder_columns(empirical_data), stage.outputs[0])
+    empsim_compiler.save_data_to_csv(empsim_compiler.reorder_columns(simulated_data), stage.outputs[1])
+
+
+def build_pipeline(config):
+    """The analysis chain for config, a dict with the keys:
+        'raw_file'           the raw export (Raw.csv)
+        'work_dir'           folder for all outputs and the pipeline state
+        'threshold'          z-score outlier threshold (default 3)
+        'data_types', 'exclusions', 'columns_to_remove', 'column_replacements', 'downcast_columns'
+                             cleaning settings as in load_data.run_pipeline (defaults from load_data)
+        'columns_to_keep'    columns written to the participant files
+        'parameters_dir'     folder holding fast-dm's parameters_*.txt files, in the group/session/condition
+                             folders of the split (default: work_dir/parameters; not the split folder, whose
+                             .txt files compile reads as participant files)
+        'empirical_folders'  folders of participant files to compile (default: every condition folder of the split,
+                             which must then hold only participant .txt files)
+        'root_seed', 'n_trials', 'n_replicates'  simulation settings
+    """
+    import load_data as load
+
+    work_dir = Path(config['work_dir'])
+    raw_corrected = work_dir / 'raw_corrected.csv'
+    split_dir = work_dir / 'datasets'
+    params_file = work_dir / 'params_for_simulation.txt'
+    simulated_dir = work_dir / 'simulated'
+    parameters_dir = config.get('parameters_dir', work_dir / 'parameters')
+    empirical_folders = config.get('empirical_folders')
+
+    stages = [
+        Stage('preprocess', run_preprocess, inputs=[config['raw_file']], outputs=[raw_corrected], params={
+            'threshold': config.get('threshold', 3),
+            'data_types': config.get('data_types', load.data_types),
+            'exclusions': config.get('exclusions', load.exclusions),
+            'columns_to_remove': config.get('columns_to_remove', load.columns_to_remove),
+            'column_replacements': config.get('column_replacements', load.column_replacements),
+            'downcast_columns': config.get('downcast_columns', load.downcast_columns),
+        }),
+        Stage('split', run_split, inputs=[raw_corrected], outputs=[split_dir], params={
+            'columns_to_keep': config.get('columns_to_keep', ['subj_idx', 'SESSION', 'CONDITION', 'GROUP', 'CLUSTERS',
+                                                              'RISK', 'HEV', 'RESPONSE', 'TIME']),
+        }),
+        # fast-dm runs here, outside the pipeline, writing parameters_*.txt files
+        Stage('summarize', run_summarize, inputs=[parameters_dir], outputs=[params_file]),
+        Stage('simulate', run_simulate, inputs=[params_file], outputs=[simulated_dir], params={
+            'root_seed': config.get('root_seed', 20240101),
+            'n_trials': config.get('n_trials', 250),
+            'n_replicates': config.get('n_replicates', 1000),
+        }),
+        Stage('compile', run_compile, inputs=(empirical_folders or [split_dir]) + [simulated_dir],
+              outputs=[work_dir / 'empirical_data.csv', work_dir / 'simulated_data.csv'],
+              params={'empirical_folders': empirical_folders}),
+    ]
+    return Pipeline(stages, state_path=str(work_dir / '.pipeline_state.json'))
+
+
+if __name__ == '__main__':
+    pipeline = build_pipeline({
+        'raw_file': r"C:\Users\Darren\Desktop\CODE\FASTDM\Raw.csv",
+        'work_dir': r"C:\Users\Darren\Desktop\CODE\FASTDM",
+    })
+    pipeline.run()
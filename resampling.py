@@ -0,0 +1,166 @@
+"""
+This script runs resampling statistics on the preprocessed (outlier-corrected) trial data, as a quick check next to
+the LMMs in b0_lmm.R: bootstrap confidence intervals of mean/median/quantile RT or accuracy per cell, and
+permutation tests between the CONDITION, GROUP or SESSION levels of a cell.
+
+The cell of every trial is factorized once into integer codes. Resamples are drawn in batches as NumPy index
+arrays (a batch of resamples is one array operation), and batches can run on a process pool. Every batch has
+its own random stream spawned from the seed, so results are the same with or without the pool.
+
+    boot = bootstrap_ci(corr_datasets['Raw Data Set'], value='rt', by=['GROUP', 'SESSION', 'CONDITION'])
+    tests = permutation_tests(corr_datasets['Raw Data Set'], value='rt', by='CONDITION', within=['GROUP', 'SESSION'])
+"""
+
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+# Number of values drawn per batch; bounds the memory of one batch (8 bytes each)
+batch_elements = 10_000_000
+
+
+def group_codes(data, by):
+    """Integer code of every row's cell (the combination of the by columns) and the cells as a frame."""
+    by = [by] if isinstance(by, str) else list(by)
+    codes, cells = pd.MultiIndex.from_frame(data[by]).factorize(sort=True)
+    cells = cells.to_frame(index=False)
+    cells.columns = by
+    return codes, cells
+
+
+def _seed_sequence(seed):
+    # seed may be None, an int or a SeedSequence (as spawned by permutation_tests)
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+
+def _apply_statistic(samples, statistic):
+    # One value per row of samples
+    if statistic == 'mean':
+        return samples.mean(axis=1)
+    if statistic == 'median':
+        return np.median(samples, axis=1)
+    if isinstance(statistic, float):
+        return np.quantile(samples, statistic, axis=1)
+    raise ValueError(f"Unknown statistic {statistic!r}: use 'mean', 'median' or a quantile between 0 and 1.")
+
+
+def _batches(n_resamples, n_values):
+    batch_size = max(1, min(n_resamples, batch_elements // max(n_values, 1)))
+    return [min(batch_size, n_resamples - start) for start in range(0, n_resamples, batch_size)]
+
+
+def _bootstrap_batch(args):
+    values, statistic, size, seed = args
+    rng = np.random.default_rng(seed)
+    return _apply_statistic(values[rng.integers(0, len(values), (size, len(values)))], statistic)
+
+
+def _permutation_batch(args):
+    values, n_first, statistic, size, seed = args
+    rng = np.random.default_rng(seed)
+    permuted = rng.permuted(np.tile(values, (size, 1)), axis=1)
+    return _apply_statistic(permuted[:, :n_first], statistic) - _apply_statistic(permuted[:, n_first:], statistic)
+
+
+def _run_batches(function, jobs, processes=None, executor=None):
+    # executor: a pool shared by several calls (see permutation_tests); otherwise one is made for this call
+    if executor is not None:
+        return list(executor.map(function, jobs))
+    if processes:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return list(executor.map(function, jobs))
+    return [function(job) for job in jobs]
+
+
+def bootstrap_ci(data, value='rt', by='CONDITION', statistic='mean', n_resamples=10000, ci=0.95, seed=None,
+                 processes=None):
+    """Percentile bootstrap confidence interval of statistic of value in every cell of by.
+
+    statistic is 'mean', 'median' or a quantile (e.g. 0.9); use value='response' for accuracy.
+    Returns one row per cell with the estimate, ci_low, ci_high and number of trials.
+    """
+    codes, cells = group_codes(data, by)
+    values = data[value].to_numpy(dtype=np.float64)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(cells) + 1))
+    cell_values = [values[order[bounds[i]:bounds[i + 1]]] for i in range(len(cells))]
+
+    jobs, owners = [], []
+    for i, (cell_seed, cell) in enumerate(zip(_seed_sequence(seed).spawn(len(cells)), cell_values)):
+        sizes = _batches(n_resamples, len(cell))
+        for size, batch_seed in zip(sizes, cell_seed.spawn(len(sizes))):
+            jobs.append((cell, statistic, size, batch_seed))
+            owners.append(i)
+    results = _run_batches(_bootstrap_batch, jobs, processes)
+
+    alpha = (1 - ci) / 2
+    rows = []
+    for i, cell in enumerate(cell_values):
+        resamples = np.concatenate([result for owner, result in zip(owners, results) if owner == i])
+        low, high = np.quantile(resamples, [alpha, 1 - alpha])
+        rows.append({'estimate': _apply_statistic(cell[None, :], statistic)[0], 'ci_low': low, 'ci_high': high,
+                     'n': len(cell)})
+    return pd.concat([cells, pd.DataFrame(rows)], axis=1)
+
+
+def permutation_test(first, second, statistic='mean', n_permutations=10000, seed=None, processes=None,
+                     executor=None):
+    """Permutation test of the difference in statistic between two arrays of trial values.
+
+    executor, an open ProcessPoolExecutor, runs the batches instead of a pool made for this call.
+    Returns a dict with the observed difference (first - second) and the two-sided p-value
+    (with the +1 correction, so it is never 0).
+    """
+    first = np.asarray(first, dtype=np.float64)
+    second = np.asarray(second, dtype=np.float64)
+    values = np.concatenate([first, second])
+    observed = _apply_statistic(first[None, :], statistic)[0] - _apply_statistic(second[None, :], statistic)[0]
+
+    sizes = _batches(n_permutations, len(values))
+    jobs = [(values, len(first), statistic, size, batch_seed)
+            for size, batch_seed in zip(sizes, _seed_sequence(seed).spawn(len(sizes)))]
+    null = np.concatenate(_run_batches(_permutation_batch, jobs, processes, executor))
+
+    extreme = np.count_nonzero(np.abs(null) >= abs(observed) - 1e-12)
+    return {'difference': float(observed), 'p_value': (extreme + 1) / (len(null) + 1)}
+
+
+def permutation_tests(data, value='rt', by='CONDITION', within=None, statistic='mean', n_permutations=10000,
+                      seed=None, processes=None):
+    """Permutation tests between every pair of levels of by, separately within every cell of within.
+
+    e.g. by='CONDITION', within=['GROUP', 'SESSION'] compares SHAM, SPL and VMPFC within every group and
+    session. Returns one row per comparison with the levels, n of each, the difference and the p-value.
+    """
+    columns = ([within] if isinstance(within, str) else list(within or [])) + [by]
+    codes, cells = group_codes(data, columns)
+    values = data[value].to_numpy(dtype=np.float64)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(cells) + 1))
+
+    strata = cells.groupby(columns[:-1], sort=False).groups if len(columns) > 1 else {(): cells.index}
+    seeds = iter(_seed_sequence(seed).spawn(sum(len(rows) * (len(rows) - 1) // 2 for rows in strata.values())))
+    rows = []
+    # One pool for all comparisons, not one per pair
+    executor = None
+    if processes:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=processes)
+    try:
+        for stratum, cell_rows in strata.items():
+            for first, second in combinations(cell_rows, 2):
+                test = permutation_test(values[order[bounds[first]:bounds[first + 1]]],
+                                        values[order[bounds[second]:bounds[second + 1]]],
+                                        statistic, n_permutations, next(seeds), executor=executor)
+                row = dict(zip(columns[:-1], stratum if isinstance(stratum, tuple) else (stratum,)))
+                row.update({f'{by}_1': cells.at[first, by], f'{by}_2': cells.at[second, by],
+                            'n_1': int(bounds[first + 1] - bounds[first]),
+                            'n_2': int(bounds[second + 1] - bounds[second])})
+                row.update(test)
+                rows.append(row)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return pd.DataFrame(rows)
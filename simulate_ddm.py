@@ -0,0 +1,245 @@
+"""
+This script runs drift-diffusion simulations for every row of a parameter table, in Python instead of through
+fast-dm's construct-samples.exe (see simulate_mvrnorm.R, which it replaces).
+For each row it draws one parameter set from a multivariate normal around the row's fitted a, v, t0 and st0
+(using the covariance of all rows), then simulates RT/response data for all trials of each replicate at once in NumPy.
+Rows run on a process pool and the results stay in memory; writing the usual *_sim.dat files is optional.
+
+Random streams are derived from a root seed, each row's (group, session, condition, subject) key and the
+replicate number (in run_simulations and run_simulation_driver alike), so results do not depend on the order or
+the machine rows run on, and a single row or replicate can be rerun bit-identically.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+param_columns = ['a', 'v', 't0', 'st0']
+id_columns = ['group', 'session', 'condition', 'subject']
+
+
+def load_params(file_path):
+    """Read params_for_simulation.txt (tab-separated, as written by metasummarizer.R)."""
+    return pd.read_csv(file_path, sep='\t')
+
+
+# Function to calculate covariance matrix of the parameters
+def calculate_cov_matrix(params_data):
+    # Calculate covariance matrix using complete observations
+    cov_matrix = params_data[param_columns].dropna().cov().to_numpy()
+
+    # Check if the matrix is positive definite
+    if np.any(np.linalg.eigvalsh(cov_matrix) <= 0):
+        raise ValueError("cov_matrix is not positive definite")
+    return cov_matrix
+
+
+def draw_parameters(mean_params, cov_matrix, rng):
+    """Draw one parameter set around mean_params (a, v, t0, st0), with the same constraints as simulate_mvrnorm.R."""
+    a, v, t0, st0 = rng.multivariate_normal(mean_params, cov_matrix)
+    # Ensure parameters are non-negative and adhere to specific constraints (t0 is at least 3 * st0, as in the R script)
+    return {'a': float(max(a, 0)), 'v': float(max(v, 0)), 't0': float(max(t0, 3 * st0)), 'st0': float(max(st0, 0))}
+
+
+def key_words(key):
+    """Stable integers for a (group, session, condition, subject) key, usable as a SeedSequence spawn_key."""
+    return tuple(int.from_bytes(hashlib.sha256(str(part).encode()).digest()[:8], 'little') for part in key)
+
+
+def row_seed_sequence(root_seed, key):
+    """Seed sequence of one row, for its parameter draw."""
+    return np.random.SeedSequence(root_seed, spawn_key=key_words(key) + (0,))
+
+
+def replicate_seed_sequence(root_seed, key, replicate):
+    """Seed sequence of one replicate of one row, independent of every other row and replicate."""
+    return np.random.SeedSequence(root_seed, spawn_key=key_words(key) + (1, replicate))
+
+
+def simulate_ddm(a, v, t0, st0, n_trials, rng, z=0.5, dt=0.001, max_time=10, batch_size=10000, block_steps=200):
+    """Simulate n_trials diffusion trials (Euler scheme, diffusion constant 1, as in fast-dm).
+
+    The process starts at z * a and runs until it crosses a (response 1) or 0 (response 0). The
+    non-decision time is drawn uniformly from [t0 - st0 / 2, t0 + st0 / 2]. Trials are simulated in
+    batches of batch_size, block_steps time steps at a time. Trials that have not finished after
+    max_time seconds get a NaN RT.
+
+    Returns (response int8, rt float32) arrays.
+    """
+    responses = []
+    rts = []
+    max_steps = int(max_time / dt)
+    for batch_start in range(0, n_trials, batch_size):
+        n = min(batch_size, n_trials - batch_start)
+        decision_time = np.full(n, np.nan)
+        response = np.zeros(n, dtype=np.int8)
+        position = np.full(n, z * a)
+        active = np.arange(n)
+        elapsed = 0
+
+        while active.size and elapsed < max_steps:
+            steps = rng.standard_normal((active.size, block_steps)) * np.sqrt(dt) + v * dt
+            paths = position[active, None] + np.cumsum(steps, axis=1)
+            crossed = (paths >= a) | (paths <= 0)
+            finished = crossed.any(axis=1)
+            first_crossing = crossed.argmax(axis=1)
+
+            done = active[finished]
+            decision_time[done] = (elapsed + first_crossing[finished] + 1) * dt
+            response[done] = paths[finished, first_crossing[finished]] >= a
+            position[active[~finished]] = paths[~finished, -1]
+            active = active[~finished]
+            elapsed += block_steps
+
+        non_decision_time = t0 + st0 * (rng.random(n) - 0.5)
+        responses.append(response)
+        rts.append((decision_time + non_decision_time).astype(np.float32))
+
+    return np.concatenate(responses), np.concatenate(rts)
+
+
+def run_simulation(row, cov_matrix, n_trials=250, n_replicates=1000, seed=None, dt=0.001):
+    """Simulate one parameter-table row: one parameter draw, then n_replicates datasets of n_trials trials.
+
+    seed is the root seed of the per-row, per-replicate streams (see simulate_replicates), so a row gives
+    the same trials here as in run_simulation_driver; without a seed a fresh one is drawn. Returns a dict
+    with the row's identifiers, the drawn parameters, and 'response', 'rt' and 'replicate' arrays.
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    return simulate_replicates(row, cov_matrix, seed, n_trials, n_replicates, dt=dt)
+
+
+def simulation_filename(result):
+    return f"{result['group']}_{result['session']}_{result['condition']}_{result['subject']}_sim.dat"
+
+
+def write_simulation(result, output_dir):
+    """Write one row's trials as a two-column (response, RT) *_sim.dat file, as simulate_mvrnorm.R did."""
+    file_path = os.path.join(output_dir, simulation_filename(result))
+    np.savetxt(file_path, np.column_stack([result['response'], result['rt']]), fmt=['%d', '%.6f'])
+    return file_path
+
+
+def _run_row(args):
+    row, cov_matrix, n_trials, n_replicates, seed, dt = args
+    return run_simulation(row, cov_matrix, n_trials, n_replicates, seed, dt)
+
+
+def run_simulations(params_data, n_trials=250, n_replicates=1000, processes=None, seed=None, dt=0.001, output_dir=None):
+    """Run run_simulation for every row of params_data on a process pool.
+
+    Every row and replicate gets its own random stream from seed and the row's key, as in
+    run_simulation_driver; without a seed a fresh one is drawn. If output_dir is given, each row is also
+    written as a *_sim.dat file there. Returns the list of results in row order.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    cov_matrix = calculate_cov_matrix(params_data)
+    rows = params_data.to_dict('records')
+    jobs = [(row, cov_matrix, n_trials, n_replicates, seed, dt) for row in rows]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for result in executor.map(_run_row, jobs):
+            if output_dir is not None:
+                os.makedirs(output_dir, exist_ok=True)
+                write_simulation(result, output_dir)
+            results.append(result)
+    return results
+
+
+# Reproducible simulation driver
+def simulate_replicates(row, cov_matrix, root_seed, n_trials=250, n_replicates=1000, replicates=None, dt=0.001):
+    """Simulate the replicates of one row, each with its own generator (see replicate_seed_sequence).
+
+    replicates selects which replicate numbers to simulate (default: all n_replicates); any subset gives
+    exactly the trials those replicates have in a full run. The parameter draw uses the row's own stream,
+    so it is the same for every subset. Returns a dict like run_simulation.
+    """
+    key = [row[col] for col in id_columns]
+    params = draw_parameters([row[col] for col in param_columns], cov_matrix,
+                             np.random.default_rng(row_seed_sequence(root_seed, key)))
+    if replicates is None:
+        replicates = range(n_replicates)
+
+    responses, rts, replicate_numbers = [], [], []
+    for replicate in replicates:
+        rng = np.random.default_rng(replicate_seed_sequence(root_seed, key, replicate))
+        response, rt = simulate_ddm(params['a'], params['v'], params['t0'], params['st0'], n_trials, rng, dt=dt)
+        finished = ~np.isnan(rt)
+        responses.append(response[finished])
+        rts.append(rt[finished])
+        replicate_numbers.append(np.full(finished.sum(), replicate, dtype=np.int32))
+
+    result = {col: row[col] for col in id_columns}
+    result.update({'params': params,
+                   'response': np.concatenate(responses) if responses else np.zeros(0, dtype=np.int8),
+                   'rt': np.concatenate(rts) if rts else np.zeros(0, dtype=np.float32),
+                   'replicate': np.concatenate(replicate_numbers) if replicate_numbers else np.zeros(0, dtype=np.int32)})
+    return result
+
+
+def _simulate_and_write(args):
+    row, cov_matrix, root_seed, n_trials, n_replicates, dt, output_dir = args
+    result = simulate_replicates(row, cov_matrix, root_seed, n_trials, n_replicates, dt=dt)
+
+    # Write to a temporary name first, so an interrupted row is never mistaken for a finished one
+    file_path = os.path.join(output_dir, simulation_filename(result))
+    tmp_path = file_path + '.tmp'
+    np.savetxt(tmp_path, np.column_stack([result['response'], result['rt']]), fmt=['%d', '%.6f'])
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+def run_simulation_driver(params_data, root_seed, output_dir, n_trials=250, n_replicates=1000, processes=None,
+                          dt=0.001, resume=True):
+    """Simulate every row of params_data into output_dir with per-row, per-replicate random streams.
+
+    Results depend only on root_seed and each row's key, so rows can be split across processes or
+    machines (e.g. by passing slices of params_data) in any order. With resume=True, rows whose
+    *_sim.dat file already exists are skipped, so a failed run can be restarted. A row that raises is
+    reported and does not stop the others.
+
+    Returns a dict with the 'written', 'skipped' and 'failed' (file name, error) rows.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    os.makedirs(output_dir, exist_ok=True)
+    cov_matrix = calculate_cov_matrix(params_data)
+
+    summary = {'written': [], 'skipped': [], 'failed': []}
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {}
+        for row in params_data.to_dict('records'):
+            file_name = simulation_filename(row)
+            if resume and os.path.exists(os.path.join(output_dir, file_name)):
+                summary['skipped'].append(file_name)
+                continue
+            job = (row, cov_matrix, root_seed, n_trials, n_replicates, dt, output_dir)
+            futures[executor.submit(_simulate_and_write, job)] = file_name
+
+        for future in as_completed(futures):
+            try:
+                future.result()
+                summary['written'].append(futures[future])
+            except Exception as e:
+                print(f"Error running simulation for {futures[future]}: {e}")
+                summary['failed'].append((futures[future], str(e)))
+    return summary
+
+
+if __name__ == '__main__':
+    # Set the folder containing params_for_simulation.txt; the simulated files are written next to it
+    working_directory = r"C:\Users\Darren\Desktop\CODE\FASTDM\models\simulated models\sim_b0"
+
+    root_seed = 20240101  # keep fixed to reproduce (and resume) a run
+
+    params_data = load_params(os.path.join(working_directory, "params_for_simulation.txt"))
+    summary = run_simulation_driver(params_data, root_seed, working_directory)
+    print(f"Simulated {len(summary['written'])} rows into {working_directory} "
+          f"({len(summary['skipped'])} already done, {len(summary['failed'])} failed)")
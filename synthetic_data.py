@@ -0,0 +1,120 @@
+"""
+This script generates synthetic data with the shape of the MGT exports, for benchmarks and for trying the scripts
+without the real data.
+
+raw_export builds a raw export with the columns of Raw.csv (PARTICIPANT, GROUP, SESSION, CONDITION, CLUSTERS,
+NetRT, HEVC, ... including the columns load_data removes) for a given number of participants, sessions,
+conditions and trials. write_raw_export writes one to CSV in blocks of participants, so large scales are
+never held in memory at once. write_fastdm_outputs writes fast-dm style *_sim.dat simulation outputs
+(two columns, RESPONSE and TIME) named like the files of simulate_mvrnorm.R.
+"""
+
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+groups = ['PLACEBO', 'PROBIOTICS']
+conditions = ['SHAM', 'SPL', 'VMPFC']
+clusters = ['low risk', 'medium risk', 'high risk']
+
+# Columns load_data.columns_to_remove drops; filled with noise so the removal has real work to do
+extra_columns = ['REP', 'SESSIONCOMPLETE', 'NrOfPink', 'TokenLoc', 'BettingValuePink', 'BettingValueBlue',
+                 'TRIALCODE', 'TrialOnset', 'ResponseTime', 'ValidTrial', 'ProbPink', 'ProbBlue', 'TRIAL HANDLE',
+                 'EVPINK', 'EVBLUE', 'EVDIFF', 'EV.PICKED', 'VARPINK', 'VARBLUE', 'VARDIFF', 'VARPICKED']
+
+
+def participant_ids(first, n):
+    return [f'PT{number:04d}' for number in range(first + 1, first + n + 1)]
+
+
+def raw_export(n_participants=40, n_sessions=2, n_trials=100, seed=0, first_participant=0, dropout_rate=0.05):
+    """Raw trial data: n_trials per participant x session x condition, participants alternating over the groups.
+
+    RTs (NetRT) are shifted log-normal with a few fast guesses and slow outliers, so the RT floor and
+    z-score filters both remove trials. A dropout_rate share of participants is marked as DROPOUT.
+    """
+    rng = np.random.default_rng([seed, first_participant])
+    ids = participant_ids(first_participant, n_participants)
+    n_cells = n_participants * n_sessions * len(conditions)
+    n_rows = n_cells * n_trials
+
+    cell = np.arange(n_rows) // n_trials
+    participant = cell // (n_sessions * len(conditions))
+    session = cell // len(conditions) % n_sessions + 1
+    condition = cell % len(conditions)
+
+    rt = 0.3 + rng.lognormal(-0.5, 0.5, n_rows)
+    guesses = rng.random(n_rows) < 0.01
+    rt[guesses] = rng.uniform(0, 0.1, guesses.sum())
+    slow = rng.random(n_rows) < 0.005
+    rt[slow] += rng.uniform(5, 15, slow.sum())
+    dropout = rng.random(n_participants) < dropout_rate
+
+    data = {
+        'PARTICIPANT': np.array(ids)[participant],
+        'CONDITION': np.array(conditions)[condition],
+        'GROUP': np.array(groups)[(first_participant + participant) % len(groups)],
+        'SESSION': session,
+        'CONCLUDED': np.where(dropout[participant], 'DROPOUT', 'YES'),
+        'CLUSTERS': np.array(clusters)[rng.integers(0, len(clusters), n_rows)],
+        'NetRT': rt,
+        'HEVC': (rng.random(n_rows) < 0.7).astype(np.int64),
+        'RISK': rng.random(n_rows),
+        'HEV': rng.random(n_rows),
+        'RESPONSE': rng.integers(0, 2, n_rows),
+        'TIME': rt,
+    }
+    for col in extra_columns:
+        data[col] = rng.random(n_rows) if col not in ('REP', 'SESSIONCOMPLETE') else 1
+    return pd.DataFrame(data)
+
+
+def participants_for_rows(n_rows, n_sessions=2, n_trials=100):
+    """Number of participants (at least one per group) for a raw export of about n_rows trials."""
+    return max(len(groups), math.ceil(n_rows / (n_sessions * len(conditions) * n_trials)))
+
+
+def write_raw_export(file_path, n_participants=40, n_sessions=2, n_trials=100, seed=0, block_participants=200):
+    """Write a raw export to file_path as CSV, block_participants participants at a time. Returns the number of rows."""
+    rows = 0
+    for first in range(0, n_participants, block_participants):
+        block = raw_export(min(block_participants, n_participants - first), n_sessions, n_trials, seed, first)
+        block.to_csv(file_path, mode='w' if first == 0 else 'a', header=first == 0, index=False)
+        rows += len(block)
+    return rows
+
+
+def simulated_filename(group, session, condition, participant):
+    # e.g. probiotic_s1_sham_pt_15_sim.dat, as written by simulate_mvrnorm.R
+    group = group.lower().replace('probiotics', 'probiotic')
+    return f'{group}_s{session}_{condition.lower()}_pt_{participant.strip("PT")}_sim.dat'
+
+
+def write_fastdm_outputs(directory, n_participants=40, n_sessions=2, n_trials=250, seed=0):
+    """Write one *_sim.dat file (RESPONSE, TIME columns) per participant x session x condition. Returns the file paths."""
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    file_paths = []
+    for i, participant in enumerate(participant_ids(0, n_participants)):
+        for session in range(1, n_sessions + 1):
+            for condition in conditions:
+                response = (rng.random(n_trials) < 0.7).astype(np.int8)
+                rt = 0.3 + rng.lognormal(-0.5, 0.5, n_trials)
+                file_path = os.path.join(directory, simulated_filename(groups[i % len(groups)], session,
+                                                                       condition, participant))
+                np.savetxt(file_path, np.column_stack([response, rt]), fmt=['%d', '%.6f'])
+                file_paths.append(file_path)
+    return file_paths
+
+
+if __name__ == '__main__':
+    # Set the output folder and scale
+    output_dir = r"C:\Users\Darren\Desktop\CODE\FASTDM\synthetic"
+    n_participants = 60
+
+    os.makedirs(output_dir, exist_ok=True)
+    rows = write_raw_export(os.path.join(output_dir, 'Raw.csv'), n_participants)
+    files = write_fastdm_outputs(os.path.join(output_dir, 'simulated'), n_participants)
+    print(f"Wrote {rows} raw trials and {len(files)} simulation files to {output_dir}")
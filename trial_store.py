@@ -0,0 +1,110 @@
+"""
+This script keeps the corrected trial data in a compact, memory-mappable store, so the scripts after main.py do not
+re-parse raw_corrected.csv (and its repeated strings such as 'PT0015', 'PLACEBO' or 'low risk') on every run.
+
+A store is a folder with one .npy file per column and a schema.json. Text columns (subject, group, condition,
+clusters, ...) are integer codes into a list of categories stored in the schema, 'rt' is float32, 'response'
+int8 (when all values are whole numbers) and integer columns the smallest integer type that holds them. Other float
+columns (TIME, RISK, HEV, ...) stay float64, so files written from a store match those written from the CSV.
+Loading memory-maps the .npy files and builds categorical columns from the codes, so a store loads in
+milliseconds and takes a fraction of the memory of the object-dtype frame.
+
+    write_trial_store(corr_datasets['Raw Data Set'], 'raw_corrected_store')
+    data = load_trial_store('raw_corrected_store', columns=['subj_idx', 'GROUP', 'SESSION', 'rt', 'response'])
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+schema_file = 'schema.json'
+index_column = '__index__'
+
+
+def _code_dtype(n_categories):
+    return np.int8 if n_categories < 2 ** 7 else np.int16 if n_categories < 2 ** 15 else np.int32
+
+
+def encode_column(name, column, float_dtype=np.float64):
+    """Compact array and schema entry for one column."""
+    if column.dtype == object or isinstance(column.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(column):
+        codes, categories = pd.factorize(column, sort=True)
+        categories = [str(category) for category in categories]
+        return codes.astype(_code_dtype(len(categories))), {'kind': 'category', 'categories': categories}
+
+    values = column.to_numpy()
+    if pd.api.types.is_bool_dtype(values):
+        return values.astype(np.int8), {'kind': 'bool'}
+    if name == 'response' or pd.api.types.is_integer_dtype(values):
+        if not np.isnan(values.astype(np.float64)).any() and (values == np.round(values)).all():
+            return pd.to_numeric(pd.Series(values.astype(np.int64)), downcast='integer').to_numpy(), {'kind': 'value'}
+    if name == 'rt':
+        return values.astype(np.float32), {'kind': 'value'}
+    return values.astype(float_dtype), {'kind': 'value'}
+
+
+def write_trial_store(data, store_dir, float_dtype=np.float64):
+    """Write a dataframe (e.g. the corrected raw data set) as a trial store folder, replacing an existing one.
+
+    The dataframe's index is kept (as in raw_corrected.csv). Only 'rt' is stored as float32; float_dtype=np.float32
+    also downcasts the other float columns, at the cost of their precision.
+    """
+    tmp_dir = str(store_dir).rstrip('/\\') + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    schema = {'rows': len(data), 'columns': {}}
+    columns = [(index_column, data.index.to_series())] + list(data.items())
+    for i, (name, column) in enumerate(columns):
+        values, entry = encode_column(name, column, float_dtype)
+        entry['file'] = f'{i:03d}.npy'
+        np.save(os.path.join(tmp_dir, entry['file']), np.ascontiguousarray(values))
+        schema['columns'][name] = entry
+    with open(os.path.join(tmp_dir, schema_file), 'w') as f:
+        json.dump(schema, f, indent=1)
+
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+    return store_dir
+
+
+def is_trial_store(path):
+    return os.path.isfile(os.path.join(path, schema_file))
+
+
+def read_schema(store_dir):
+    with open(os.path.join(store_dir, schema_file)) as f:
+        return json.load(f)
+
+
+def open_trial_store(store_dir, columns=None):
+    """Memory-mapped arrays of a store, without building a dataframe: (column -> array, schema).
+
+    Category columns are their integer codes; the categories are in schema['columns'][name]['categories'].
+    """
+    schema = read_schema(store_dir)
+    names = [name for name in schema['columns'] if name != index_column] if columns is None else columns
+    arrays = {name: np.load(os.path.join(store_dir, schema['columns'][name]['file']), mmap_mode='r') for name in names}
+    return arrays, schema
+
+
+def load_trial_store(store_dir, columns=None):
+    """Load a store (or only columns of it) as a dataframe with categorical text columns and its original index."""
+    arrays, schema = open_trial_store(store_dir, columns)
+    data = {}
+    for name, values in arrays.items():
+        entry = schema['columns'][name]
+        if entry['kind'] == 'category':
+            data[name] = pd.Categorical.from_codes(values, entry['categories'])
+        elif entry['kind'] == 'bool':
+            data[name] = values.astype(bool)
+        else:
+            data[name] = values
+    index_entry = schema['columns'][index_column]
+    index = np.load(os.path.join(store_dir, index_entry['file']), mmap_mode='r')
+    if index_entry['kind'] == 'category':
+        index = np.asarray(index_entry['categories'], dtype=object)[index]
+    return pd.DataFrame(data, index=pd.Index(index), columns=list(arrays))
@@ -0,0 +1,151 @@
+"""
+This script keeps a precomputed, interpolated table of the diffusion model's first-passage time CDF (start point
+z = a/2, as in fit_ddm and simulate_ddm), so predicted CDFs, quantiles and accuracies are table lookups instead
+of series expansions.
+
+The (a, v, t) dependence is folded into two variables: with u = t / a^2 and lambda = v * a, the lower-boundary CDF
+is exp(-lambda / 2) * G(|lambda|, u), where G(l, u) is the integral of exp(-l^2 s / 2) f(s) over s up to u and
+f is the standard density of fit_ddm.standard_density. The table holds G on a grid of |lambda| (linear) and u
+(logarithmic) and is interpolated bilinearly; the exponential factor is exact. A second table holds the integral
+of G over u, which turns the uniform st0 variability into the difference of two lookups. This covers every
+(a, v, t) on the fitting bounds of fit_ddm with two small tables. Recently used parameter vectors keep their
+predicted CDF curve in a bounded LRU cache, and the tables are saved to disk (wiener_table.npz next to this file)
+so later runs start warm.
+"""
+
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+table_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wiener_table.npz')
+
+_default_table = None
+
+
+class WienerTable:
+    def __init__(self, lambda_grid, u_grid, integral, integral2, t_max=10.0, n_rt=1000, cache_size=1024):
+        self.lambda_grid = lambda_grid
+        self.u_grid = u_grid
+        self.log_u_grid = np.log(u_grid)
+        self.integral = integral
+        self.integral2 = integral2
+        # Fixed RT grid for cached prediction curves
+        self.rt_grid = np.linspace(0, t_max, n_rt)
+        self.cache_size = cache_size
+        self._curves = OrderedDict()
+
+    @classmethod
+    def build(cls, max_lambda=40.0, n_lambda=401, u_range=(1e-3, 60.0), n_u=2048, **kwargs):
+        """Compute the tables (well under a second); the defaults cover |v * a| up to 40 and t / a^2 up to 60."""
+        from fit_ddm import standard_density
+
+        lambda_grid = np.linspace(0, max_lambda, n_lambda)
+        u_grid = np.geomspace(*u_range, n_u)
+        density = standard_density(u_grid, 0.5)
+        integrand = np.exp(-lambda_grid[:, None] ** 2 * u_grid[None, :] / 2) * density[None, :]
+        steps = (integrand[:, 1:] + integrand[:, :-1]) / 2 * np.diff(u_grid)[None, :]
+        integral = np.concatenate([np.zeros((n_lambda, 1)), np.cumsum(steps, axis=1)], axis=1)
+        steps2 = (integral[:, 1:] + integral[:, :-1]) / 2 * np.diff(u_grid)[None, :]
+        integral2 = np.concatenate([np.zeros((n_lambda, 1)), np.cumsum(steps2, axis=1)], axis=1)
+        return cls(lambda_grid, u_grid, integral, integral2, **kwargs)
+
+    def save(self, file_path=table_path):
+        # A temporary file of its own, so processes saving at the same time never publish a partial file
+        fd, tmp_path = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(os.path.abspath(file_path)))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, lambda_grid=self.lambda_grid, u_grid=self.u_grid, integral=self.integral,
+                                    integral2=self.integral2)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return file_path
+
+    @classmethod
+    def load(cls, file_path=table_path, **kwargs):
+        with np.load(file_path) as data:
+            return cls(data['lambda_grid'], data['u_grid'], data['integral'], data['integral2'], **kwargs)
+
+    def _lookup(self, table, lam, u):
+        # Bilinear interpolation of table at |lambda| and log u (u > 0), clamped to the grid
+        position = np.interp(np.abs(lam), self.lambda_grid, np.arange(len(self.lambda_grid)))
+        row = np.minimum(position.astype(int), len(self.lambda_grid) - 2)
+        weight = position - row
+        log_u = np.log(u)
+        column = np.clip(np.searchsorted(self.log_u_grid, log_u) - 1, 0, len(self.u_grid) - 2)
+        u_weight = np.clip((log_u - self.log_u_grid[column]) / (self.log_u_grid[column + 1] - self.log_u_grid[column]), 0, 1)
+        return ((1 - weight) * ((1 - u_weight) * table[row, column] + u_weight * table[row, column + 1])
+                + weight * ((1 - u_weight) * table[row + 1, column] + u_weight * table[row + 1, column + 1]))
+
+    def _scaled_lambda(self, a, v, response):
+        # The upper boundary is the lower boundary of the mirrored process (-v, same start point a/2)
+        return np.where(np.asarray(response) == 1, -v, v) * a
+
+    def decision_cdf(self, t, a, v, response=0):
+        """CDF of the decision time t through the lower (response 0) or upper (response 1) boundary."""
+        t = np.asarray(t, dtype=np.float64)
+        lam = np.broadcast_to(self._scaled_lambda(a, v, response), t.shape)
+        integral = self._lookup(self.integral, lam, np.maximum(t, 1e-300) / a ** 2)
+        return np.where(t > 0, np.exp(-lam / 2) * integral, 0.0)
+
+    def integrated_cdf(self, t, a, v, response=0):
+        """Integral of decision_cdf from 0 to t (linear beyond the table, where the CDF has reached its total)."""
+        t = np.asarray(t, dtype=np.float64)
+        lam = np.broadcast_to(self._scaled_lambda(a, v, response), t.shape)
+        u = np.maximum(t, 1e-300) / a ** 2
+        u_max = self.u_grid[-1]
+        integral2 = self._lookup(self.integral2, lam, np.minimum(u, u_max))
+        integral2 += np.maximum(u - u_max, 0) * self._lookup(self.integral, lam, np.full_like(u, u_max))
+        return np.where(t > 0, a ** 2 * np.exp(-lam / 2) * integral2, 0.0)
+
+    def cdf(self, rt, response, a, v, t0, st0=0.0):
+        """Defective CDF of the observed RT for each response, with non-decision time uniform on [t0 - st0/2, t0 + st0/2]."""
+        rt = np.asarray(rt, dtype=np.float64)
+        if st0 < 1e-6:
+            return self.decision_cdf(rt - t0, a, v, response)
+        # Averaging the CDF over the non-decision interval is a difference of its integral
+        return (self.integrated_cdf(rt - t0 + st0 / 2, a, v, response)
+                - self.integrated_cdf(rt - t0 - st0 / 2, a, v, response)) / st0
+
+    def curve(self, a, v, t0, st0, response):
+        """Predicted CDF of one response on rt_grid; the most recent cache_size curves are kept."""
+        key = (float(a), float(v), float(t0), float(st0), int(response))
+        if key in self._curves:
+            self._curves.move_to_end(key)
+            return self._curves[key]
+        values = self.cdf(self.rt_grid, response, a, v, t0, st0)
+        self._curves[key] = values
+        if len(self._curves) > self.cache_size:
+            self._curves.popitem(last=False)
+        return values
+
+    def accuracy(self, a, v):
+        """Probability of the upper-boundary response (1); exact, no lookup needed."""
+        if abs(v * a) < 1e-8:
+            return 0.5
+        return float((1 - np.exp(-v * a)) / (1 - np.exp(-2 * v * a)))
+
+    def quantiles(self, a, v, t0, st0, quantiles=(0.1, 0.3, 0.5, 0.7, 0.9), response=1):
+        """Predicted RT quantiles of one response (of its RT distribution given that response), from the cached curve."""
+        curve = self.curve(a, v, t0, st0, response)
+        total = self.accuracy(a, v) if response == 1 else 1 - self.accuracy(a, v)
+        return np.interp(np.asarray(quantiles) * total, curve, self.rt_grid)
+
+
+def default_table(file_path=table_path):
+    """The table of this process: loaded from file_path, or built and saved there on first use."""
+    global _default_table
+    if _default_table is None:
+        if os.path.exists(file_path):
+            _default_table = WienerTable.load(file_path)
+        else:
+            _default_table = WienerTable.build()
+            try:
+                _default_table.save(file_path)
+            except OSError as e:
+                print(f"Could not save the Wiener table to {file_path}: {e}")
+    return _default_table